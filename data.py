@@ -63,7 +63,7 @@ def generate_lab_results():
         results.append(phrasing)
     return results
 
-def generate_report_text():
+def generate_report_text(date=None):
     # Patient details
     name = fake.name()
     age = random.randint(20, 80)
@@ -71,7 +71,7 @@ def generate_report_text():
     patient_id = fake.bothify(text="HSP#####")
     doctor = fake.name()
     hospital = fake.company() + " Hospital"
-    date = datetime.date.today().strftime("%Y-%m-%d")
+    date = (date or datetime.date.today()).strftime("%Y-%m-%d")
 
     diagnosis = random.sample(diagnosis_list, k=random.randint(1, 2))
     meds = random.sample(medications_list, k=random.randint(1, 3))
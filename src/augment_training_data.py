@@ -1,8 +1,17 @@
 import re
-from preprocessing import read_reports_from_folder
+from preprocessing import iter_reports
 
-def augment_report_abbreviations(text):
-    """Replace full names with abbreviations."""
+# With an rng, each occurrence is swapped with this probability, so every
+# draw gives a different mix of original and augmented wording.
+SWAP_PROBABILITY = 0.5
+
+def _replace(text, old, new, rng=None):
+    if rng is None:
+        return text.replace(old, new)
+    return re.sub(re.escape(old), lambda m: new if rng.random() < SWAP_PROBABILITY else m.group(0), text)
+
+def augment_report_abbreviations(text, rng=None):
+    """Replace full names with abbreviations (a random subset of them with `rng`)."""
     replacements = {
         'Haemoglobin': 'Hb',
         'Total RBC': 'RBC',
@@ -16,12 +25,12 @@ def augment_report_abbreviations(text):
     
     augmented = text
     for full, abbrev in replacements.items():
-        augmented = augmented.replace(full, abbrev)
+        augmented = _replace(augmented, full, abbrev, rng)
     
     return augmented
 
-def augment_report_phrasing(text):
-    """Change sentence structures."""
+def augment_report_phrasing(text, rng=None):
+    """Change sentence structures (a random subset of them with `rng`)."""
     replacements = {
         'came out to be': 'shows',
         'was measured at': 'recorded at',
@@ -33,49 +42,80 @@ def augment_report_phrasing(text):
     
     augmented = text
     for old, new in replacements.items():
-        augmented = augmented.replace(old, new)
+        augmented = _replace(augmented, old, new, rng)
     
     return augmented
 
-def augment_report_flags(text):
-    """Change flag formats."""
+def augment_report_flags(text, rng=None):
+    """Change flag formats (a random subset of them with `rng`)."""
     augmented = text
-    augmented = augmented.replace('Marked as H', 'elevated')
-    augmented = augmented.replace('Marked as L', 'decreased')
+    augmented = _replace(augmented, 'Marked as H', 'elevated', rng)
+    augmented = _replace(augmented, 'Marked as L', 'decreased', rng)
     return augmented
 
-def augment_report_spacing(text):
-    """Add spacing variations."""
+def augment_report_spacing(text, rng=None):
+    """Add spacing variations (to a random subset of values with `rng`)."""
     augmented = text
-    augmented = re.sub(r'(\d+\.?\d*)\s+(g/dL|mill/cmm|/uL|%)', r'\1\2', augmented)
-    return augmented
+    if rng is None:
+        return re.sub(r'(\d+\.?\d*)\s+(g/dL|mill/cmm|/uL|%)', r'\1\2', augmented)
+    return re.sub(r'(\d+\.?\d*)\s+(g/dL|mill/cmm|/uL|%)',
+                  lambda m: m.group(1) + m.group(2) if rng.random() < SWAP_PROBABILITY else m.group(0),
+                  augmented)
+
+# Named transforms; "a+b" applies a, then b.
+AUGMENTATIONS = {
+    'original': lambda text, rng=None: text,
+    'abbreviations': augment_report_abbreviations,
+    'phrasing': augment_report_phrasing,
+    'flags': augment_report_flags,
+    'spacing': augment_report_spacing,
+}
+
+DEFAULT_AUGMENTATIONS = "original,abbreviations,phrasing,flags,spacing,phrasing+abbreviations"
 
-def create_augmented_dataset():
+def parse_augmentations(spec=DEFAULT_AUGMENTATIONS):
+    """Parse "name[:copies],..." into [(name, [functions], copies)].
+
+    A name may chain transforms with "+", e.g. "phrasing+abbreviations:2"
+    emits two copies of each report with phrasing and then abbreviations
+    applied.
+    """
+    parsed = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, copies = item.partition(':')
+        functions = []
+        for part in name.split('+'):
+            if part not in AUGMENTATIONS:
+                raise ValueError(f"Unknown augmentation '{part}'; choose from {', '.join(AUGMENTATIONS)}")
+            functions.append(AUGMENTATIONS[part])
+        parsed.append((name, functions, int(copies) if copies else 1))
+    return parsed
+
+def apply_augmentation(text, functions, rng=None):
+    """Apply transforms in order; with a random.Random, each picks a random subset of its swaps."""
+    for function in functions:
+        text = function(text, rng)
+    return text
+
+def iter_augmented_reports(texts, spec=DEFAULT_AUGMENTATIONS):
+    """Yield every configured variant of each report text, one report at a time."""
+    augmentations = parse_augmentations(spec)
+    for text in texts:
+        for _, functions, copies in augmentations:
+            augmented = apply_augmentation(text, functions)
+            for _ in range(copies):
+                yield augmented
+
+def create_augmented_dataset(spec=DEFAULT_AUGMENTATIONS):
     """Create augmented training dataset."""
     
     print("Loading original training reports...")
-    original_reports = read_reports_from_folder("data/Train", limit=70)
-    print(f"Loaded {len(original_reports)} original reports")
-    
-    augmented_data = []
+    original_reports = iter_reports("data/Train", limit=70)
     
-    for filename, text in original_reports.items():
-        augmented_data.append(text)
-        
-        var1 = augment_report_abbreviations(text)
-        augmented_data.append(var1)
-        
-        var2 = augment_report_phrasing(text)
-        augmented_data.append(var2)
-        
-        var3 = augment_report_flags(text)
-        augmented_data.append(var3)
-        
-        var4 = augment_report_spacing(text)
-        augmented_data.append(var4)
-        
-        var5 = augment_report_abbreviations(augment_report_phrasing(text))
-        augmented_data.append(var5)
+    augmented_data = list(iter_augmented_reports((text for _, text in original_reports), spec))
     
     print(f"Created {len(augmented_data)} training examples (original + augmented)")
     return augmented_data
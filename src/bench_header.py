@@ -0,0 +1,50 @@
+import timeit
+from preprocessing import iter_reports
+from extraction import extract_diagnosis, extract_patient_info, extract_patient_info_legacy, report_sections
+
+def layout_variants(text):
+    """The report as-is plus layouts the section splitter must also handle."""
+    yield "original", text
+    yield "leading title line", "Laboratory Report\n" + text
+    yield "leading blank lines", "\n\n" + text
+    yield "CRLF line endings", text.replace("\n", "\r\n")
+    yield "diagnosis list on the next line", text.replace("Diagnosis includes: ", "Diagnosis includes:\n")
+
+def check_parity(texts):
+    """Count reports per layout where section parsing differs from the legacy whole-text parsers.
+
+    Both the parser on the full text and the parser on the header
+    section from report_sections (what extract_all uses) are checked,
+    the labs section must not pick up any header line, and the diagnosis
+    section must give the diagnoses found in the whole original report.
+    """
+    mismatches = {}
+    for text in texts:
+        expected = extract_patient_info_legacy(text)
+        labs = report_sections(text)["labs"].strip()
+        diagnosis = extract_diagnosis(text)
+        for name, variant in layout_variants(text):
+            sections = report_sections(variant)
+            if (extract_patient_info(variant) != expected
+                    or extract_patient_info(sections["header"]) != expected
+                    or sections["labs"].replace("\r", "").strip() != labs
+                    or extract_diagnosis(sections["diagnosis"]) != diagnosis):
+                mismatches[name] = mismatches.get(name, 0) + 1
+    return mismatches
+
+def run_benchmark(folder_path="data/Train", repeat=5, number=20):
+    """Compare the single-pass header parser with the legacy multi-scan one."""
+    texts = [text for _, text in iter_reports(folder_path)]
+    
+    mismatches = check_parity(texts)
+    print(f"Reports: {len(texts)}, parity mismatches: {sum(mismatches.values())}")
+    for name, count in mismatches.items():
+        print(f"  {name}: {count}")
+    
+    for name, func in [("legacy", extract_patient_info_legacy), ("single-pass", extract_patient_info)]:
+        timings = timeit.repeat(lambda: [func(text) for text in texts], repeat=repeat, number=number)
+        per_report = min(timings) / (number * len(texts)) * 1e6
+        print(f"{name:>12}: {per_report:.2f} us/report")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,179 @@
+import json
+import random
+import timeit
+from evaluate import evaluate_labs, evaluate_labs_legacy, fuzzy_match
+from gazetteer import DEFAULT_VOCABULARY_PATH
+from lab_matching import NAME_SIMILARITY_THRESHOLD, bounded_edit_distance, normalize_test_name
+
+def _lab(test, value, unit='g/dL', flag=None):
+    lab = {'test': test, 'value': value, 'unit': unit}
+    if flag:
+        lab['flag'] = flag
+    return lab
+
+HB = _lab('Haemoglobin', 8.6, flag='L')
+LYMPH = _lab('Lymphocytes', 18.3, '%', 'L')
+PLT = _lab('Platelets', 142757.0, '/uL', 'L')
+EOS = _lab('Eosinophils', 0.8, '%', 'L')
+
+# (description, ground truth, predicted, expected (tp, fp, fn) or None when
+# evaluate_labs must agree with evaluate_labs_legacy).
+PARITY_CASES = [
+    ("exact names", [HB, LYMPH], [HB, LYMPH], None),
+    ("different case", [HB], [dict(HB, test='haemoglobin')], None),
+    ("typo within the cut-off", [LYMPH], [dict(LYMPH, test='Lymphocytez')], None),
+    ("wrong value", [HB], [dict(HB, value=9.6)], None),
+    ("missing prediction", [HB, LYMPH], [HB], None),
+    ("extra prediction", [HB], [HB, PLT], None),
+    ("exact duplicate prediction", [HB], [HB, dict(HB)], None),
+    # Intended differences from the legacy scorer:
+    ("alias matches its canonical name", [HB], [dict(HB, test='Hb')], (3, 0, 0)),
+    ("case-variant duplicate is a false positive", [LYMPH],
+     [dict(LYMPH, test='lymphocytes'), LYMPH], (3, 3, 0)),
+    ("near-duplicate prediction is a false positive", [LYMPH],
+     [LYMPH, dict(LYMPH, test='Lymphocytez')], (3, 3, 0)),
+    ("exact name wins over an earlier near match", [PLT],
+     [dict(PLT, test='Platelsts', value=1.0), PLT], (3, 3, 0)),
+    ("two edits in an 11-letter name is past the cut-off", [EOS], [dict(EOS, test='Eainophils')], (0, 3, 3)),
+]
+
+def _counts(metrics):
+    return metrics[3:]
+
+def _similar(a, b):
+    """The new scorer's name test on already-normalised keys."""
+    max_distance = int((1 - NAME_SIMILARITY_THRESHOLD) * max(len(a), len(b)) + 1e-9)
+    return bounded_edit_distance(a, b, max_distance) is not None
+
+def _legacy_choices(ground_truth, predicted):
+    """The prediction name the legacy scorer pairs with each ground-truth name."""
+    pred_names = list({lab['test']: lab for lab in predicted})
+    choices = {}
+    for gt_name in {lab['test']: lab for lab in ground_truth}:
+        choices[gt_name] = next((name for name in pred_names if fuzzy_match(gt_name, name, threshold=0.85)), None)
+    return choices
+
+def explain_difference(ground_truth, predicted):
+    """Names of the documented differences (see evaluate_labs) present in one case.
+
+    'alias': a prediction shares a canonical name with a ground-truth
+    test that SequenceMatcher does not find similar. 'one_to_one': a
+    prediction the legacy scorer left unpaired but never counted as a
+    false positive, or one prediction claimed by several tests.
+    'best_match': the legacy scorer took an earlier near match although
+    an exact name was predicted. 'similarity': SequenceMatcher and the
+    normalised edit distance disagree at the 0.85 cut-off.
+    """
+    reasons = set()
+    for pred in predicted:
+        for gt in ground_truth:
+            pred_key, gt_key = normalize_test_name(pred['test']), normalize_test_name(gt['test'])
+            if pred_key == gt_key:
+                if not fuzzy_match(pred['test'], gt['test'], threshold=0.85):
+                    reasons.add('alias')
+            elif fuzzy_match(pred_key, gt_key, threshold=0.85) != _similar(pred_key, gt_key):
+                reasons.add('similarity')
+
+    choices = _legacy_choices(ground_truth, predicted)
+    chosen = [name for name in choices.values() if name is not None]
+    if len(set(chosen)) < len(chosen):
+        reasons.add('one_to_one')
+    pred_names = {lab['test'] for lab in predicted}
+    for name in pred_names - set(chosen):
+        if any(fuzzy_match(name, gt_name, threshold=0.85) for gt_name in choices):
+            reasons.add('one_to_one')
+    for gt_name, name in choices.items():
+        if name is not None and name != gt_name and gt_name in pred_names:
+            reasons.add('best_match')
+    return reasons
+
+def test_aliases(path=DEFAULT_VOCABULARY_PATH):
+    """{canonical test name: [aliases]} from the lab vocabulary."""
+    with open(path, "r") as f:
+        return json.load(f)["TEST_NAME"]
+
+def random_case(rng, aliases):
+    """Ground truth plus a prediction with dropped, renamed, misspelt, duplicated and extra labs."""
+    names = sorted(aliases)
+    ground_truth = [_lab(name, round(rng.uniform(1, 100), 2), flag=rng.choice('HL'))
+                    for name in rng.sample(names, rng.randint(1, len(names)))]
+    predicted = []
+    for gt in ground_truth:
+        if rng.random() < 0.1:
+            continue
+        pred = dict(gt)
+        roll = rng.random()
+        if roll < 0.15 and aliases[gt['test']]:
+            pred['test'] = rng.choice(aliases[gt['test']])
+        elif roll < 0.25:
+            pred['test'] = gt['test'].lower()
+        elif roll < 0.35:
+            for _ in range(rng.choice((1, 1, 2))):
+                i = rng.randrange(len(pred['test']))
+                pred['test'] = pred['test'][:i] + rng.choice('aeiourst') + pred['test'][i + 1:]
+        if rng.random() < 0.1:
+            pred['value'] += 1
+        predicted.append(pred)
+        if rng.random() < 0.1:
+            predicted.append(dict(pred, test=rng.choice([pred['test'].upper(), pred['test'].lower()])))
+    if rng.random() < 0.1:
+        predicted.append({'test': rng.choice(names), 'value': 1.0})
+    rng.shuffle(predicted)
+    return ground_truth, predicted
+
+def check_parity(samples=3000, seed=0):
+    """Check PARITY_CASES, then attribute every randomised disagreement to a documented difference.
+
+    Returns (failed case descriptions, disagreements, {reason: count},
+    unexplained disagreements).
+    """
+    failed = []
+    for description, ground_truth, predicted, expected in PARITY_CASES:
+        new = evaluate_labs(predicted, ground_truth)
+        if expected is None:
+            if new != evaluate_labs_legacy(predicted, ground_truth):
+                failed.append(description)
+        elif _counts(new) != expected:
+            failed.append(description)
+
+    aliases = test_aliases()
+    rng = random.Random(seed)
+    disagreements = 0
+    reasons = {}
+    unexplained = []
+    for _ in range(samples):
+        ground_truth, predicted = random_case(rng, aliases)
+        if evaluate_labs(predicted, ground_truth) == evaluate_labs_legacy(predicted, ground_truth):
+            continue
+        disagreements += 1
+        found = explain_difference(ground_truth, predicted)
+        for reason in found:
+            reasons[reason] = reasons.get(reason, 0) + 1
+        if not found:
+            unexplained.append((ground_truth, predicted))
+    return failed, disagreements, reasons, unexplained
+
+def run_benchmark(samples=3000, seed=0, repeat=5, number=3):
+    """Parity report and timing of the new scorer against the legacy one."""
+    failed, disagreements, reasons, unexplained = check_parity(samples, seed)
+    print(f"Parity cases: {len(PARITY_CASES) - len(failed)}/{len(PARITY_CASES)} as expected")
+    for description in failed:
+        print(f"  FAILED: {description}")
+    print(f"Random cases: {disagreements}/{samples} differ from the legacy scorer, "
+          f"{len(unexplained)} not explained by a documented difference")
+    for reason, count in sorted(reasons.items()):
+        print(f"  {reason}: {count}")
+
+    rng = random.Random(seed)
+    aliases = test_aliases()
+    cases = [random_case(rng, aliases) for _ in range(200)]
+    for name, func in [("legacy", evaluate_labs_legacy), ("alias+edit", evaluate_labs)]:
+        timings = timeit.repeat(lambda: [func(pred, gt) for gt, pred in cases], repeat=repeat, number=number)
+        per_case = min(timings) / (number * len(cases)) * 1e6
+        print(f"{name:>12}: {per_case:.2f} us/case")
+
+    if failed or unexplained:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    run_benchmark()
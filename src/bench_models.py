@@ -0,0 +1,91 @@
+import argparse
+import json
+import os
+import statistics
+import time
+from extraction import report_sections
+from model_loader import load_ner_model
+from preprocessing import iter_reports
+from train import DevSet
+
+def lab_lines(test_folder):
+    """Stripped, non-empty lab-section lines: what extraction sends to the model."""
+    lines = []
+    for _, text in iter_reports(test_folder):
+        lines.extend(line.strip() for line in report_sections(text)["labs"].split("\n") if line.strip())
+    return lines
+
+def model_size_mb(model_path):
+    total = sum(os.path.getsize(os.path.join(root, name))
+                for root, _, files in os.walk(model_path) for name in files)
+    return total / (1024 * 1024)
+
+def architecture(nlp):
+    """tok2vec and hidden-layer sizes from the loaded NER component's config."""
+    model = nlp.config["components"]["ner"]["model"]
+    tok2vec = model.get("tok2vec", {})
+    sizes = {key: tok2vec.get(key) for key in ("width", "depth", "embed_size", "window_size")}
+    sizes["hidden_width"] = model.get("hidden_width")
+    return sizes
+
+def benchmark_model(model_path, lines, dev_set, repeat=5, batch_size=256):
+    """Batched tokens/s, unbatched per-line latency and dev-set lab F1 for one model."""
+    nlp = load_ner_model(model_path)
+    nlp(lines[0])
+
+    tokens = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for doc in nlp.pipe(lines, batch_size=batch_size):
+            tokens += len(doc)
+    elapsed = time.perf_counter() - started
+
+    latencies = []
+    for line in lines:
+        started = time.perf_counter()
+        nlp(line)
+        latencies.append(time.perf_counter() - started)
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+
+    scores = dev_set.score(nlp)
+    return {
+        "architecture": architecture(nlp),
+        "size_mb": round(model_size_mb(model_path), 2),
+        "tokens_per_second": round(tokens / elapsed),
+        "lines_per_second": round(len(lines) * repeat / elapsed, 1),
+        "line_p50_ms": round(cuts[49] * 1000, 4),
+        "line_p95_ms": round(cuts[94] * 1000, 4),
+        "line_p99_ms": round(cuts[98] * 1000, 4),
+        "precision": round(scores["precision"], 4),
+        "recall": round(scores["recall"], 4),
+        "f1": round(scores["f1"], 4),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare NER model tiers on speed and lab F1.")
+    parser.add_argument("--models", default="medical_ner_model_v2",
+                        help="Comma-separated model directories, e.g. one per tier from train.py --tier")
+    parser.add_argument("--test-folder", default="data/Test")
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the lab lines for tokens/s")
+    parser.add_argument("--batch-size", type=int, default=256, help="Lines per nlp.pipe batch")
+    parser.add_argument("--output", default="output/model_benchmark.json")
+    args = parser.parse_args()
+
+    lines = lab_lines(args.test_folder)
+    dev_set = DevSet(args.test_folder, args.batch_size)
+    print(f"{len(lines)} lab lines from {len(dev_set.filenames)} reports in {args.test_folder}")
+
+    results = {}
+    for model_path in args.models.split(","):
+        r = results[model_path] = benchmark_model(model_path, lines, dev_set, args.repeat, args.batch_size)
+        print(f"{model_path}: {r['tokens_per_second']} tokens/s, line p50 {r['line_p50_ms']:.3f}ms "
+              f"p95 {r['line_p95_ms']:.3f}ms, F1 {r['f1']:.3f}, {r['size_mb']} MB")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({"test_folder": args.test_folder, "lines": len(lines), "repeat": args.repeat,
+                   "models": results}, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import argparse
+import datetime
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from faker import Faker
+
+# data.py (the synthetic report generator) lives at the repo root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data import generate_report_text
+from preprocessing import iter_reports
+from extraction import (extract_diagnosis, extract_lab_results_ner, extract_medications,
+                        extract_patient_info, lab_from_spans, report_sections)
+from evaluate import evaluate_labs, evaluate_structure
+from lab_rules import LabLineRules
+from model_loader import load_ner_model
+
+STAGES = ("read", "header", "ner_labs", "diagnosis_meds", "json_output", "evaluation")
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+# Report date stamped into generated corpora instead of today's date.
+CORPUS_DATE = datetime.date(2025, 1, 1)
+
+def generate_corpus(n, seed=0, corpus_dir="cache/bench"):
+    """Write n reports from data.generate_report_text with a fixed seed and date; reused once complete."""
+    folder = os.path.join(corpus_dir, f"corpus-{n}-seed{seed}")
+    marker = os.path.join(folder, ".complete")
+    if os.path.exists(marker):
+        return folder
+    
+    os.makedirs(folder, exist_ok=True)
+    random.seed(seed)
+    Faker.seed(seed)
+    for i in range(n):
+        with open(os.path.join(folder, f"report_{i + 1:06d}.txt"), "w") as f:
+            f.write(generate_report_text(CORPUS_DATE))
+    open(marker, "w").close()
+    return folder
+
+def peak_rss_mb():
+    """Process high-water RSS in MB (ru_maxrss is KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def summarize(latencies, rss_before):
+    """Throughput, latency percentiles and memory for one stage."""
+    total = sum(latencies)
+    if len(latencies) > 1:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    else:
+        cuts = latencies * 99
+    peak = peak_rss_mb()
+    return {
+        "reports": len(latencies),
+        "total_seconds": round(total, 4),
+        "reports_per_second": round(len(latencies) / total, 1) if total > 0 else None,
+        "p50_ms": round(cuts[49] * 1000, 4),
+        "p95_ms": round(cuts[94] * 1000, 4),
+        "p99_ms": round(cuts[98] * 1000, 4),
+        "peak_rss_mb": round(peak, 1),
+        "rss_growth_mb": round(peak - rss_before, 1)
+    }
+
+def timed(func, items):
+    """Apply func to every item, returning outputs and per-item latencies."""
+    outputs = []
+    latencies = []
+    for item in items:
+        started = time.perf_counter()
+        outputs.append(func(item))
+        latencies.append(time.perf_counter() - started)
+    return outputs, latencies
+
+def reference_labs(labs_text, rules):
+    """Ground-truth labs for a generated report, from the template rules instead of the model."""
+    labs = []
+    for line in labs_text.split("\n"):
+        spans = rules.match(line)
+        if spans:
+            lab = lab_from_spans(line, spans)
+            if lab.get("test"):
+                labs.append(lab)
+    return labs
+
+def run_corpus(folder, nlp):
+    """Run every stage over the corpus, one stage at a time, and summarize each.
+    
+    Stages run back to back over all reports, so peak RSS is the
+    high-water mark reached by the end of that stage. 'header' also
+    covers segmenting the report into sections.
+    """
+    stages = {}
+    
+    rss_before = peak_rss_mb()
+    reports = iter_reports(folder)
+    texts = []
+    latencies = []
+    while True:
+        started = time.perf_counter()
+        report = next(reports, None)
+        if report is None:
+            break
+        latencies.append(time.perf_counter() - started)
+        texts.append(report[1])
+    stages["read"] = summarize(latencies, rss_before)
+    
+    rss_before = peak_rss_mb()
+    def parse_header(text):
+        sections = report_sections(text)
+        return sections, extract_patient_info(sections["header"])
+    parsed, latencies = timed(parse_header, texts)
+    stages["header"] = summarize(latencies, rss_before)
+    
+    rss_before = peak_rss_mb()
+    labs, latencies = timed(lambda item: extract_lab_results_ner(item[0]["labs"], nlp), parsed)
+    stages["ner_labs"] = summarize(latencies, rss_before)
+    
+    rss_before = peak_rss_mb()
+    clinical, latencies = timed(lambda item: (extract_diagnosis(item[0]["diagnosis"]),
+                                              extract_medications(item[0]["medications"])), parsed)
+    stages["diagnosis_meds"] = summarize(latencies, rss_before)
+    
+    records = [
+        {"patient": patient, "labs": lab_results, "diagnosis": diagnosis, "medications": medications}
+        for (_, patient), lab_results, (diagnosis, medications) in zip(parsed, labs, clinical)
+    ]
+    
+    rss_before = peak_rss_mb()
+    with tempfile.TemporaryFile("w") as out:
+        _, latencies = timed(lambda record: out.write(json.dumps(record, indent=4)), records)
+    stages["json_output"] = summarize(latencies, rss_before)
+    
+    rules = LabLineRules()
+    references = [reference_labs(sections["labs"], rules) for sections, _ in parsed]
+    rss_before = peak_rss_mb()
+    _, latencies = timed(lambda item: (evaluate_labs(item[0]["labs"], item[1]), evaluate_structure(item[0])),
+                         list(zip(records, references)))
+    stages["evaluation"] = summarize(latencies, rss_before)
+    
+    total = sum(stage["total_seconds"] for stage in stages.values())
+    return {
+        "stages": stages,
+        "end_to_end": {
+            "total_seconds": round(total, 4),
+            "reports_per_second": round(len(texts) / total, 1) if total > 0 else None
+        }
+    }
+
+def compare_to_baseline(results, baseline, tolerance=0.10):
+    """List stages whose throughput fell or p95 latency rose by more than `tolerance`."""
+    regressions = []
+    for size, run in results["corpora"].items():
+        base_run = baseline.get("corpora", {}).get(size)
+        if base_run is None:
+            continue
+        for stage, current in run["stages"].items():
+            base = base_run["stages"].get(stage)
+            if base is None:
+                continue
+            if base["reports_per_second"] and current["reports_per_second"] is not None:
+                change = current["reports_per_second"] / base["reports_per_second"] - 1
+                if change < -tolerance:
+                    regressions.append(f"{size} {stage}: reports/s {base['reports_per_second']} -> "
+                                       f"{current['reports_per_second']} ({change:+.0%})")
+            if base["p95_ms"] > 0:
+                change = current["p95_ms"] / base["p95_ms"] - 1
+                if change > tolerance:
+                    regressions.append(f"{size} {stage}: p95 {base['p95_ms']}ms -> "
+                                       f"{current['p95_ms']}ms ({change:+.0%})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark each extraction stage on generated corpora.")
+    parser.add_argument("--model", default="medical_ner_model_v2")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="Comma-separated corpus sizes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus-dir", default="cache/bench")
+    parser.add_argument("--output", default="output/benchmark.json")
+    parser.add_argument("--baseline", default=None,
+                        help="Earlier benchmark JSON to compare against; exits 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Allowed relative slowdown before a stage counts as regressed")
+    args = parser.parse_args()
+    
+    nlp = load_ner_model(args.model)
+    
+    results = {"model": args.model, "seed": args.seed, "corpora": {}}
+    for size in (int(size) for size in args.sizes.split(",")):
+        print(f"Corpus of {size} reports (seed {args.seed})...")
+        folder = generate_corpus(size, args.seed, args.corpus_dir)
+        run = run_corpus(folder, nlp)
+        results["corpora"][str(size)] = run
+        for stage in STAGES:
+            s = run["stages"][stage]
+            print(f"  {stage:>15}: {s['reports_per_second']:>10} reports/s  p50 {s['p50_ms']:.3f}ms  "
+                  f"p95 {s['p95_ms']:.3f}ms  p99 {s['p99_ms']:.3f}ms  peak RSS {s['peak_rss_mb']} MB")
+        print(f"  {'end-to-end':>15}: {run['end_to_end']['reports_per_second']:>10} reports/s")
+    
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {args.output}")
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) against {args.baseline}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SAMPLE_REPORT = """Hospital: Flores, Willis and Doyle Hospital
+Patient: Alexis Vance, ID HSP13997, Age 24, Gender Female
+Consulting Doctor: Dr. Alexander Miller, Date: 2025-11-15
+Haemoglobin (g/dL) came out to be 8.63 g/dL, compared to normal 12.0-16.0. Marked as L.
+Final Clinical Notes:
+Diagnosis includes: Hypertension
+Medications prescribed:
+ - Aspirin 81 mg, OD"""
+
+def scenarios(model_path, model_cache_dir):
+    """Name -> Python source, each run in a fresh interpreter."""
+    return {
+        "interpreter": "pass",
+        "import_extraction": "import extraction",
+        "import_evaluate": "import evaluate",
+        "import_llm_insights": "import llm_insights",
+        "import_spacy": "import spacy",
+        "load_model_full": f"import spacy; spacy.load({model_path!r})",
+        "load_model_trimmed": f"from model_loader import load_ner_model; load_ner_model({model_path!r})",
+        "load_model_warm_cache": (f"from model_loader import load_ner_model; "
+                                  f"load_ner_model({model_path!r}, cache_dir={model_cache_dir!r})"),
+        "first_extraction": (f"from model_loader import load_ner_model; from extraction import extract_all; "
+                             f"extract_all({SAMPLE_REPORT!r}, load_ner_model({model_path!r}))"),
+    }
+
+def time_cold_start(code, repeat=5):
+    """Wall-clock seconds for `repeat` fresh interpreters running `code`."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=SRC_DIR, check=True,
+                       stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+def run_benchmark(model_path="medical_ner_model_v2", repeat=5):
+    """Median and best cold-start time per scenario, in seconds."""
+    model_path = os.path.abspath(model_path)
+    results = {}
+    with tempfile.TemporaryDirectory() as model_cache_dir:
+        # Prime the serialized copy so the warm-cache scenario measures a hit.
+        subprocess.run([sys.executable, "-c", f"from model_loader import load_ner_model; "
+                        f"load_ner_model({model_path!r}, cache_dir={model_cache_dir!r})"],
+                       cwd=SRC_DIR, check=True, stdout=subprocess.DEVNULL)
+        for name, code in scenarios(model_path, model_cache_dir).items():
+            timings = time_cold_start(code, repeat)
+            results[name] = {
+                "median_seconds": round(statistics.median(timings), 4),
+                "best_seconds": round(min(timings), 4),
+            }
+            print(f"{name:>22}: {results[name]['median_seconds']:.3f}s median, "
+                  f"{results[name]['best_seconds']:.3f}s best")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure cold-start time of imports and model loading.")
+    parser.add_argument("--model", default="medical_ner_model_v2")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default="output/startup_benchmark.json")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.model, args.repeat)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({"model": args.model, "repeat": args.repeat, "scenarios": results}, f, indent=2)
+    print(f"Results saved to {args.output}")
@@ -1,14 +1,11 @@
-import json
-from preprocessing import read_reports_from_folder
-from extraction import generate_training_data
+from preprocessing import iter_reports
+from extraction import create_training_example
+from training_corpus import write_docbin_corpus
 
-reports = read_reports_from_folder("data/Train", limit=70)
-print(f"Loaded {len(reports)} reports")
+reports = iter_reports("data/Train", limit=70)
 
-training_data = generate_training_data(reports)
-print(f"Created {len(training_data)} training examples")
+examples = (create_training_example(text) for _, text in reports)
+count = write_docbin_corpus(examples, "corpus/train")
+print(f"Created {count} training examples")
 
-with open("training_data.json", "w") as f:
-    json.dump(training_data, f, indent=2)
-
-print("Saved training_data.json")
\ No newline at end of file
+print("Saved corpus/train/*.spacy")
@@ -1,22 +1,34 @@
-from augment_training_data import create_augmented_dataset
-from extraction import create_training_example
-import json
+import argparse
+import os
+import time
+from augment_training_data import DEFAULT_AUGMENTATIONS, iter_augmented_reports
+from preprocessing import iter_reports
+from training_corpus import DEFAULT_SHARD_SIZE, build_training_corpus
 
-print("Creating augmented dataset...")
-augmented_texts = create_augmented_dataset()
-print(f"Generated {len(augmented_texts)} augmented reports")
+def main():
+    parser = argparse.ArgumentParser(description="Build the augmented NER training corpus.")
+    parser.add_argument("--folder", default="data/Train")
+    parser.add_argument("--limit", type=int, default=70)
+    parser.add_argument("--augmentations", default=DEFAULT_AUGMENTATIONS,
+                        help="Comma-separated name[:copies] list; chain transforms with '+'")
+    parser.add_argument("--output", default="corpus/train_augmented")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Worker processes (1 runs in-process)")
+    parser.add_argument("--chunk-size", type=int, default=256, help="Reports per worker task")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE, help="Docs per .spacy shard")
+    args = parser.parse_args()
+    
+    print(f"Augmenting reports from {args.folder} with {args.augmentations}...")
+    reports = iter_reports(args.folder, limit=args.limit)
+    texts = iter_augmented_reports((text for _, text in reports), args.augmentations)
+    
+    started = time.perf_counter()
+    count = build_training_corpus(texts, args.output, workers=args.workers,
+                                  chunk_size=args.chunk_size, shard_size=args.shard_size)
+    elapsed = time.perf_counter() - started
+    
+    print(f"\nCreated {count} training examples in {elapsed:.1f}s with {args.workers} worker(s)")
+    print(f"Saved to {args.output}/*.spacy")
 
-print("\nGenerating training data...")
-training_data = []
-for i, text in enumerate(augmented_texts):
-    if i % 50 == 0:
-        print(f"  Processing {i}/{len(augmented_texts)}...")
-    example = create_training_example(text)
-    training_data.append(example)
-
-print(f"\nCreated {len(training_data)} training examples")
-
-with open("training_data_augmented.json", "w") as f:
-    json.dump(training_data, f, indent=2)
-
-print(f"Saved to training_data_augmented.json")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
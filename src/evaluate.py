@@ -1,13 +1,16 @@
-import spacy
+import argparse
+import asyncio
 import json
 import os
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from difflib import SequenceMatcher
-from preprocessing import read_reports_from_folder
-from extraction import extract_all
-from dotenv import load_dotenv
-
-load_dotenv()
+from preprocessing import iter_reports
+from extraction_cache import ExtractionCache, extraction_options
+from lab_matching import match_labs
+from pipeline import extract_reports_parallel
+from llm_prompts import LLMMetrics, compact_json, compact_report, count_tokens, truncate_to_budget
 
 def fuzzy_match(str1, str2, threshold=0.8):
     """Check if two strings are similar using fuzzy matching."""
@@ -28,8 +31,74 @@ def evaluate_patient_info(predicted, ground_truth):
     
     return correct, total
 
+def score_lab_fields(matched_pred, gt_lab):
+    """Return (true_positives, false_negatives) for one matched lab pair."""
+    true_positives = 0
+    false_negatives = 0
+    
+    if 'value' in gt_lab:
+        if 'value' in matched_pred and abs(matched_pred['value'] - gt_lab['value']) < 0.1:
+            true_positives += 1
+        else:
+            false_negatives += 1
+    
+    if 'unit' in gt_lab:
+        if 'unit' in matched_pred and fuzzy_match(matched_pred['unit'], gt_lab['unit']):
+            true_positives += 1
+        else:
+            false_negatives += 1
+    
+    if 'flag' in gt_lab:
+        if 'flag' in matched_pred and matched_pred['flag'] == gt_lab['flag']:
+            true_positives += 1
+        else:
+            false_negatives += 1
+    
+    return true_positives, false_negatives
+
 def evaluate_labs(predicted_labs, ground_truth_labs):
-    """Evaluate lab results with fuzzy matching."""
+    """Evaluate lab results, pairing tests one-to-one via the alias index and edit distance.
+
+    Per-field scoring is the same as evaluate_labs_legacy, but pairing
+    differs on purpose, so some cases score differently:
+    - an alias such as "Hb" or "Hct" matches its canonical test instead
+      of counting as a miss plus a false positive;
+    - each prediction pairs with at most one test, so a second
+      prediction of the same test ("lymphocytes" next to "Lymphocytes",
+      or a misspelt copy) is a false positive, where the legacy scorer
+      ignored it;
+    - an exactly named prediction wins over an earlier near match;
+    - names are compared by normalised edit distance rather than
+      SequenceMatcher ratio at the same 0.85 cut-off, so some misspellings
+      with two or more edits no longer match.
+    bench_lab_matching.py holds a parity case for each of these and
+    checks that randomised disagreements come only from them.
+    """
+    true_positives = 0
+    false_positives = 0
+    false_negatives = 0
+    
+    pairs, unmatched_gt, unmatched_pred = match_labs(ground_truth_labs, predicted_labs)
+    
+    for gt_lab, matched_pred in pairs:
+        tp, fn = score_lab_fields(matched_pred, gt_lab)
+        true_positives += tp
+        false_negatives += fn
+    
+    for gt_lab in unmatched_gt:
+        false_negatives += sum(1 for k in ['value', 'unit', 'flag'] if k in gt_lab)
+    
+    for pred_lab in unmatched_pred:
+        false_positives += sum(1 for k in ['value', 'unit', 'flag'] if k in pred_lab)
+    
+    precision = true_positives / (true_positives + false_positives) if (true_positives + false_positives) > 0 else 0
+    recall = true_positives / (true_positives + false_negatives) if (true_positives + false_negatives) > 0 else 0
+    f1 = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
+    
+    return precision, recall, f1, true_positives, false_positives, false_negatives
+
+def evaluate_labs_legacy(predicted_labs, ground_truth_labs):
+    """Original all-pairs SequenceMatcher scoring, kept for parity checks."""
     true_positives = 0
     false_positives = 0
     false_negatives = 0
@@ -122,23 +191,26 @@ def evaluate_structure(extracted_data):
     
     return max(0, score), issues
 
-def llm_evaluation(original_text, extracted_data, api_key=None):
-    """Use LLM to semantically evaluate extraction quality."""
-    
-    if not api_key:
-        return None, "LLM evaluation skipped (no API key provided)"
-    
-    try:
-        from openai import OpenAI
-        client = OpenAI(api_key=api_key)
-        
-        prompt = f"""You are evaluating a medical NLP extraction system.
+LLM_EVAL_MODEL = "gpt-4o-mini"
+# Input tokens allowed per evaluation request; the report is trimmed to fit.
+LLM_EVAL_TOKEN_BUDGET = 1500
+
+def build_llm_evaluation_prompt(original_text, extracted_data, token_budget=LLM_EVAL_TOKEN_BUDGET):
+    """Build the evaluation prompt with compact JSON, trimming the report to the token budget."""
+    extracted_json = compact_json(extracted_data)
+    report = compact_report(original_text)
+    overhead = count_tokens(_llm_evaluation_prompt("", extracted_json))
+    report = truncate_to_budget(report, max(token_budget - overhead, 0))
+    return _llm_evaluation_prompt(report, extracted_json)
+
+def _llm_evaluation_prompt(report, extracted_json):
+    return f"""You are evaluating a medical NLP extraction system.
 
 ORIGINAL REPORT:
-{original_text}
+{report}
 
 EXTRACTED STRUCTURED DATA:
-{json.dumps(extracted_data, indent=2)}
+{extracted_json}
 
 Evaluate how accurately the structured data captures the original report.
 
@@ -154,11 +226,25 @@ CORRECT: [brief list]
 ISSUES: [brief list]
 ASSESSMENT: [2-3 sentences]"""
 
+def llm_evaluation(original_text, extracted_data, api_key=None, metrics=None):
+    """Use LLM to semantically evaluate extraction quality."""
+    
+    if not api_key:
+        return None, "LLM evaluation skipped (no API key provided)"
+    
+    try:
+        from openai import OpenAI
+        client = OpenAI(api_key=api_key)
+        
+        prompt = build_llm_evaluation_prompt(original_text, extracted_data)
+        started = time.perf_counter()
         response = client.chat.completions.create(
-            model="gpt-4o-mini",
+            model=LLM_EVAL_MODEL,
             messages=[{"role": "user", "content": prompt}],
             max_tokens=500
         )
+        if metrics is not None:
+            metrics.record("evaluation", LLM_EVAL_MODEL, prompt, response, time.perf_counter() - started)
         
         return response.choices[0].message.content, None
         
@@ -177,29 +263,131 @@ def load_ground_truth(filename):
     with open(gt_file, 'r') as f:
         return json.load(f)
 
-def evaluate_test_set(llm_api_key=None):
-    """Run complete evaluation on test set."""
+async def llm_evaluation_async(client, original_text, extracted_data, limiter, max_retries=5, metrics=None):
+    """Async llm_evaluation on a shared client, with rate limiting and retries."""
+    from llm_insights import complete_with_retries
+    
+    prompt = build_llm_evaluation_prompt(original_text, extracted_data)
+    try:
+        content = await complete_with_retries(client, prompt, 500, limiter, max_retries, metrics=metrics,
+                                              purpose="evaluation", model=LLM_EVAL_MODEL)
+        return content, None
+    except Exception as e:
+        return None, f"LLM evaluation failed: {str(e)}"
+
+def parse_llm_score(llm_result):
+    """Pull the integer after 'SCORE:' out of an LLM evaluation, or None."""
+    try:
+        score_line = [line for line in llm_result.split('\n') if 'SCORE:' in line][0]
+        return int(score_line.split(':')[1].strip())
+    except (IndexError, ValueError):
+        return None
+
+def _add_time(timings, stage, started):
+    timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+
+async def _evaluate_reports(reports, model_path, cache, workers, chunk_size, batch_size,
+                            llm_api_key, base_url, llm_concurrency, metrics, timings):
+    """Extract, score and LLM-evaluate reports, overlapping the three stages.
+
+    Extraction runs on a helper thread (model loaded once per worker by
+    extract_reports_parallel), each report is scored as soon as it is
+    extracted, and its LLM evaluation is started right away so the
+    requests run while later reports are still being extracted.
+    """
+    loop = asyncio.get_running_loop()
+    client = limiter = semaphore = None
+    if llm_api_key:
+        from openai import AsyncOpenAI
+        from llm_insights import RateLimiter
+        client = AsyncOpenAI(api_key=llm_api_key, base_url=base_url, max_retries=0)
+        limiter = RateLimiter()
+        semaphore = asyncio.Semaphore(llm_concurrency)
+    
+    llm_window = []
+    
+    async def evaluate_with_llm(text, predicted):
+        async with semaphore:
+            llm_window.append(time.perf_counter())
+            result = await llm_evaluation_async(client, text, predicted, limiter, metrics=metrics)
+            llm_window.append(time.perf_counter())
+            return result
+    
+    # Report texts are only needed for the LLM prompt, so they are kept
+    # from when a report is read until its LLM task is created.
+    texts = {}
+    
+    def read_reports():
+        reports_iter = iter(reports)
+        while True:
+            started = time.perf_counter()
+            item = next(reports_iter, None)
+            _add_time(timings, 'read', started)
+            if item is None:
+                return
+            if client is not None:
+                texts[item[0]] = item[1]
+            yield item
+    
+    results = extract_reports_parallel(read_reports(), model_path, workers=workers, chunk_size=chunk_size,
+                                       batch_size=batch_size, cache=cache)
+    scored = []
+    llm_tasks = []
+    with ThreadPoolExecutor(max_workers=1) as extractor:
+        while True:
+            started = time.perf_counter()
+            item = await loop.run_in_executor(extractor, next, results, None)
+            _add_time(timings, 'extract', started)
+            if item is None:
+                break
+            filename, predicted = item
+            
+            started = time.perf_counter()
+            ground_truth = load_ground_truth(filename)
+            entity_metrics = evaluate_labs(predicted['labs'], ground_truth['labs'])
+            struct_score, struct_issues = evaluate_structure(predicted)
+            scored.append((filename, entity_metrics, struct_score, struct_issues))
+            _add_time(timings, 'score', started)
+            
+            if client is not None:
+                llm_tasks.append(asyncio.create_task(evaluate_with_llm(texts.pop(filename), predicted)))
+    
+    if client is None:
+        return scored, [(None, "No API key provided")] * len(scored)
+    
+    llm_outcomes = await asyncio.gather(*llm_tasks)
+    await client.close()
+    if llm_window:
+        timings['llm'] = max(llm_window) - min(llm_window)
+    return scored, llm_outcomes
+
+def evaluate_test_set(llm_api_key=None, model_path="medical_ner_model_v2", use_cache=True,
+                      test_folder="data/Test", output_file="output/evaluation_results.json",
+                      workers=None, chunk_size=8, batch_size=256, llm_concurrency=8, base_url=None):
+    """Run complete evaluation on test set.
+
+    Reports are extracted in parallel batches with the model loaded once
+    per worker, and LLM evaluations (with an API key) run concurrently
+    with extraction. Per-stage wall-clock times and reports per second
+    are written to the summary. 'llm' is the span from the first to
+    the last LLM call, so it overlaps 'extract' and 'score'. Reports are
+    streamed from `test_folder`, so 'read' is also part of 'extract'.
+    """
     
-    nlp = spacy.load("medical_ner_model_v2")
-    test_reports = read_reports_from_folder("data/Test")
+    run_started = time.perf_counter()
+    timings = {}
+    cache = ExtractionCache(model_path, options=extraction_options()) if use_cache else None
+    metrics = LLMMetrics() if llm_api_key else None
+    
+    scored, llm_outcomes = asyncio.run(_evaluate_reports(
+        iter_reports(test_folder), model_path, cache, workers, chunk_size, batch_size,
+        llm_api_key, base_url, llm_concurrency, metrics, timings
+    ))
     
     all_results = []
     llm_summary_scores = []
-    
-    for filename, text in test_reports.items():
-        predicted = extract_all(text, nlp)
-        ground_truth = load_ground_truth(filename)
-        
-        precision, recall, f1, tp, fp, fn = evaluate_labs(predicted['labs'], ground_truth['labs'])
-        struct_score, struct_issues = evaluate_structure(predicted)
-        
-        llm_result = None
-        llm_error = None
-        if llm_api_key:
-            llm_result, llm_error = llm_evaluation(text, predicted, llm_api_key)
-        else:
-            llm_error = "No API key provided"
-        
+    for (filename, entity_metrics, struct_score, struct_issues), (llm_result, llm_error) in zip(scored, llm_outcomes):
+        precision, recall, f1, tp, fp, fn = entity_metrics
         all_results.append({
             'filename': filename,
             'entity_metrics': {
@@ -216,18 +404,16 @@ def evaluate_test_set(llm_api_key=None):
         })
         
         if llm_result:
-            try:
-                score_line = [line for line in llm_result.split('\n') if 'SCORE:' in line][0]
-                score = int(score_line.split(':')[1].strip())
+            score = parse_llm_score(llm_result)
+            if score is not None:
                 llm_summary_scores.append(score)
-            except:
-                pass
     
     avg_precision = sum(r['entity_metrics']['precision'] for r in all_results) / len(all_results)
     avg_recall = sum(r['entity_metrics']['recall'] for r in all_results) / len(all_results)
     avg_f1 = sum(r['entity_metrics']['f1'] for r in all_results) / len(all_results)
     avg_struct = sum(r['structural_score'] for r in all_results) / len(all_results)
     avg_llm = sum(llm_summary_scores) / len(llm_summary_scores) if llm_summary_scores else None
+    total = time.perf_counter() - run_started
     
     results = {
         'individual_results': all_results,
@@ -243,17 +429,53 @@ def evaluate_test_set(llm_api_key=None):
             'llm_based': {
                 'avg_semantic_score': avg_llm,
                 'num_evaluated': len(llm_summary_scores)
+            },
+            'timing': {
+                'stages_seconds': {stage: round(seconds, 4) for stage, seconds in timings.items()},
+                'total_seconds': round(total, 4),
+                'reports': len(all_results),
+                'reports_per_second': round(len(all_results) / total, 2) if total > 0 else None
             }
         }
     }
     
-    output_file = "output/evaluation_results.json"
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
     with open(output_file, 'w') as f:
         json.dump(results, f, indent=2)
     
     print(f"Evaluation complete. Results saved to {output_file}")
+    print(f"{len(all_results)} reports in {total:.2f}s ({results['summary']['timing']['reports_per_second']} reports/s)")
+    for stage, seconds in timings.items():
+        print(f"  {stage}: {seconds:.3f}s")
+    if cache:
+        cache.report()
+    if metrics:
+        metrics.report()
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate extraction against the ground-truth test set.")
+    parser.add_argument("--model", default="medical_ner_model_v2")
+    parser.add_argument("--test-folder", default="data/Test")
+    parser.add_argument("--output", default="output/evaluation_results.json")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Extraction worker processes (1 runs in-process)")
+    parser.add_argument("--chunk-size", type=int, default=8, help="Reports per worker shard")
+    parser.add_argument("--batch-size", type=int, default=256, help="Lines per nlp.pipe batch")
+    parser.add_argument("--llm-concurrency", type=int, default=8,
+                        help="LLM evaluation requests in flight at once")
+    parser.add_argument("--base-url", default=os.getenv("OPENAI_BASE_URL"),
+                        help="Chat-completions endpoint, e.g. a local stub server")
+    parser.add_argument("--no-llm", action="store_true", help="Skip LLM evaluation")
+    parser.add_argument("--no-cache", action="store_true", help="Re-extract every report")
+    args = parser.parse_args()
+    
+    llm_key = None if args.no_llm else os.getenv("OPENAI_API_KEY")
+    evaluate_test_set(llm_api_key=llm_key, model_path=args.model, use_cache=not args.no_cache,
+                      test_folder=args.test_folder, output_file=args.output, workers=args.workers,
+                      chunk_size=args.chunk_size, batch_size=args.batch_size,
+                      llm_concurrency=args.llm_concurrency, base_url=args.base_url)
 
 if __name__ == "__main__":
+    from dotenv import load_dotenv
     load_dotenv()
-    llm_key = os.getenv("OPENAI_API_KEY")
-    evaluate_test_set(llm_api_key=llm_key)
\ No newline at end of file
+    main()
@@ -1,8 +1,69 @@
 import re
+from collections import Counter
 from pprint import pprint
+from gazetteer import load_gazetteer
+from ner_memo import doc_spans
+from instrumentation import timer_for
+
+HEADER_TEMPLATE = re.compile(
+    r'\s*Hospital:[ \t]*(?P<hospital>[^\n]*)\n'
+    r'Patient:\s*(?P<name>[^,\n]+),\s*ID\s+(?P<id>\w+),\s*Age\s+(?P<age>\d+),\s*Gender\s+(?P<gender>\w+)[^\n]*\n'
+    r'Consulting Doctor:\s*Dr\.\s*(?P<doctor>[^,\n]+),\s*Date:\s*(?P<date>\d{4}-\d{2}-\d{2})'
+)
+HEADER_PATTERN = re.compile(
+    r'Patient:\s*(?P<name>[^,\n]+)'
+    r'|Age\s+(?P<age>\d+)'
+    r'|Gender\s+(?P<gender>\w+)'
+    r'|ID\s+(?P<id>\w+)'
+    r'|Hospital:\s*(?P<hospital>.+?)(?=\n|$)'
+    r'|Consulting Doctor:\s*Dr\.\s*(?P<doctor>[^,\n]+)'
+    r'|Date:\s*(?P<date>\d{4}-\d{2}-\d{2})'
+)
+HEADER_FIELDS = ('name', 'age', 'gender', 'id', 'hospital', 'doctor', 'date')
 
 def extract_patient_info(text):
+    """Parse the report header with precompiled patterns.
+
+    The standard three-line header is matched in one anchored pass.
+    Other layouts fall back to a line scan that stops once every field
+    is found or at the first line after the header with no header
+    field, so the lab lines are never searched.
+    """
+    template_match = HEADER_TEMPLATE.match(text)
+    if template_match:
+        patient_info = {field: template_match.group(field).strip() for field in HEADER_FIELDS}
+        patient_info['age'] = int(patient_info['age'])
+        return patient_info
     
+    patient_info = {}
+    in_header = False
+    
+    pos = 0
+    while pos <= len(text):
+        end = text.find('\n', pos)
+        if end == -1:
+            end = len(text)
+        
+        matched = False
+        for match in HEADER_PATTERN.finditer(text, pos, end):
+            field = match.lastgroup
+            if field not in patient_info:
+                value = match.group(field).strip()
+                patient_info[field] = int(value) if field == 'age' else value
+            matched = True
+        
+        if matched:
+            in_header = True
+            if len(patient_info) == len(HEADER_FIELDS):
+                break
+        elif in_header:
+            break
+        pos = end + 1
+    
+    return {field: patient_info[field] for field in HEADER_FIELDS if field in patient_info}
+
+def extract_patient_info_legacy(text):
+    """Original multi-scan header parser, kept for parity checks and benchmarks."""
     patient_info = {}
     patient_name = re.search(r'Patient:\s*([^,]+)', text)
     if patient_name:
@@ -46,34 +107,13 @@ def find_test_values(text):
     return entities
 
 def find_units(text):
-    entities = []
-    units = ['g/dL', 'mill/cmm', '/uL', '%', 'mg']
-    
-    for unit in units:
-        for match in re.finditer(re.escape(unit), text):
-            start = match.start()
-            end = match.end()
-            entities.append((start, end, "UNIT"))
-    
-    return entities
+    """Find positions of units."""
+    return load_gazetteer().find(text, "UNIT")
 
 
 def find_test_names(text):
-    """Find positions of test names."""
-    entities = []
-    test_names = [
-        'Haemoglobin', 'Haematocrit', 'Total RBC', 'RBC', 
-        'WBC', 'Platelets', 'Neutrophils', 'Lymphocytes', 
-        'Monocytes', 'Eosinophils'
-    ]
-    
-    for test in test_names:
-        for match in re.finditer(re.escape(test), text, re.IGNORECASE):
-            start = match.start()
-            end = match.end()
-            entities.append((start, end, "TEST_NAME"))
-    
-    return entities
+    """Find positions of test names and their aliases."""
+    return load_gazetteer().find(text, "TEST_NAME")
 
 
 def find_flags(text):
@@ -92,9 +132,8 @@ def create_training_example(text):
     """Create one training example in spaCy format."""
     entities = []
     
-    entities.extend(find_test_names(text))
+    entities.extend(load_gazetteer().find(text))
     entities.extend(find_test_values(text))
-    entities.extend(find_units(text))
     entities.extend(find_flags(text))
     
     # Sort by position
@@ -104,11 +143,13 @@ def create_training_example(text):
     
     return (text, {"entities": entities})
 
-def generate_training_data(reports_dict):
-    """Generate training data from all reports."""
+def generate_training_data(reports):
+    """Generate training data from a {filename: text} dict or (filename, text) pairs."""
     training_data = []
 
-    for filename, text in reports_dict.items():
+    if isinstance(reports, dict):
+        reports = reports.items()
+    for filename, text in reports:
         example = create_training_example(text)
         training_data.append(example)
 
@@ -161,8 +202,178 @@ def extract_medications(text):
     return medications
 
 
-def extract_lab_results_ner(text, nlp_model):
-    """Extract lab results using trained NER model + regex for flags."""
+NOTES_MARKER = 'Final Clinical Notes:'
+DIAGNOSIS_MARKER = 'Diagnosis includes:'
+MEDICATIONS_MARKER = 'Medications prescribed:'
+
+# Non-blank lines (titles, banners) allowed before the header block.
+HEADER_SEARCH_LINES = 3
+
+def _header_end(text):
+    """End offset of the header block, or 0 when the report has none.
+
+    Like extract_patient_info's line scan, leading lines without a header
+    field are skipped (at most HEADER_SEARCH_LINES non-blank ones, and
+    never past a section marker) and the block is the run of consecutive
+    header lines after them.
+    """
+    header_end = 0
+    leading = 0
+    pos = 0
+    while pos <= len(text):
+        end = text.find('\n', pos)
+        if end == -1:
+            end = len(text)
+        line = text[pos:end]
+        
+        if HEADER_PATTERN.search(line):
+            header_end = end
+        elif header_end:
+            break
+        elif line.strip():
+            leading += 1
+            if leading > HEADER_SEARCH_LINES or NOTES_MARKER in line or DIAGNOSIS_MARKER in line \
+                    or MEDICATIONS_MARKER in line:
+                return 0
+        pos = end + 1
+    return header_end
+
+def segment_report(text):
+    """Split a report into sections in one pass over its lines after the header.
+
+    Returns {section: (start, end)} character offsets for 'header',
+    'labs', 'clinical_notes', 'diagnosis' and 'medications'. The header
+    runs from the top to the end of the header block (see _header_end),
+    so it includes any title lines above it; labs run from there to the
+    first notes, diagnosis or medications line; clinical notes run from
+    that line to the end and contain the diagnosis and the medications
+    block (its marker line plus the bullets after it). The diagnosis runs
+    from its marker line to the next notes or medications line, or the
+    end, so a list written on the lines below the marker is kept.
+    Missing sections are empty spans.
+    """
+    header_end = _header_end(text)
+    notes_start = None
+    diagnosis_start = None
+    diagnosis_end = None
+    meds_start = None
+    meds_end = None
+    in_meds = False
+    
+    pos = header_end + 1 if header_end else 0
+    while pos <= len(text):
+        end = text.find('\n', pos)
+        if end == -1:
+            end = len(text)
+        line = text[pos:end]
+        stripped = line.strip()
+        
+        if in_meds:
+            if stripped.startswith('-'):
+                meds_end = end
+            elif stripped:
+                in_meds = False
+        
+        if diagnosis_start is not None and diagnosis_end is None and (NOTES_MARKER in line or MEDICATIONS_MARKER in line):
+            diagnosis_end = pos - 1
+        if notes_start is None and (NOTES_MARKER in line or DIAGNOSIS_MARKER in line or MEDICATIONS_MARKER in line):
+            notes_start = pos
+        if diagnosis_start is None and DIAGNOSIS_MARKER in line:
+            diagnosis_start = pos
+        if meds_start is None and MEDICATIONS_MARKER in line:
+            meds_start = pos
+            meds_end = end
+            in_meds = True
+        pos = end + 1
+    
+    labs_start = min(header_end + 1, len(text)) if header_end else 0
+    labs_end = notes_start if notes_start is not None else len(text)
+    if diagnosis_start is not None and diagnosis_end is None:
+        diagnosis_end = len(text)
+    return {
+        'header': (0, header_end),
+        'labs': (labs_start, max(labs_start, labs_end)),
+        'clinical_notes': (notes_start, len(text)) if notes_start is not None else (len(text), len(text)),
+        'diagnosis': (diagnosis_start, diagnosis_end) if diagnosis_start is not None else (len(text), len(text)),
+        'medications': (meds_start, meds_end) if meds_start is not None else (len(text), len(text)),
+    }
+
+def report_sections(text):
+    """Return {section: text} for the sections found by segment_report."""
+    return {name: text[start:end] for name, (start, end) in segment_report(text).items()}
+
+
+def lab_from_spans(line, spans):
+    """Build one lab result dict from a line and its (start, end, label) entity spans."""
+    lab = {}
+    for start, end, label in spans:
+        ent_text = line[start:end]
+        if label == "TEST_NAME" and "test" not in lab:
+            lab["test"] = ent_text
+        
+        elif label == "TEST_VALUE" and "value" not in lab:
+            try:
+                lab["value"] = float(ent_text)
+            except ValueError:
+                pass
+        elif label == "UNIT" and "unit" not in lab:
+            lab["unit"] = ent_text.rstrip('.')
+        elif label == "FLAG":
+            lab["flag"] = ent_text
+    
+    if lab.get("test"):
+        flag_match = re.search(r'Marked as ([HL])', line)
+        if flag_match:
+            lab["flag"] = flag_match.group(1)
+        
+        ref_match = re.search(r'compared to normal ([\d.-]+)', line)
+        if ref_match:
+            lab["reference"] = ref_match.group(1).rstrip('.')
+    
+    return lab
+
+
+def _resolve_line(line, memo=None, rules=None, prefilter=None):
+    """Run the cheap stages for a line: prefilter, template rules, memo.
+
+    Returns (path, spans); spans is None when the line still needs NER.
+    """
+    if prefilter is not None and not prefilter.passes(line):
+        return "filtered", ()
+    if rules is not None:
+        spans = rules.match(line)
+        if spans is not None:
+            return "rules", spans
+    if memo is not None:
+        spans = memo.get(line)
+        if spans is not None:
+            return "memo", spans
+    return "model", None
+
+def _count_repeat(path, memo=None, rules=None, prefilter=None):
+    """Count a line repeated within a batch as if it went through each stage again."""
+    if prefilter is not None:
+        if path == "filtered":
+            prefilter.filtered_lines += 1
+            return
+        prefilter.passed_lines += 1
+    if rules is not None:
+        if path == "rules":
+            rules.rule_lines += 1
+            return
+        rules.fallback_lines += 1
+    if memo is not None:
+        # Served without another model call.
+        memo.hits += 1
+
+def extract_lab_results_ner(text, nlp_model, memo=None, rules=None, prefilter=None, instrumentation=None):
+    """Extract lab results using trained NER model + regex for flags.
+
+    A LinePrefilter skips lines that cannot hold a lab result, LabLineRules
+    label templated lab lines without the model, and a LineEntityMemo
+    serves lines seen before. An ExtractionInstrumentation counts lines,
+    model calls and entities and times each model call.
+    """
     lines = text.split('\n')
     lab_results = []
     
@@ -170,46 +381,144 @@ def extract_lab_results_ner(text, nlp_model):
         line = line.strip()
         if not line:
             continue
+        if instrumentation is not None:
+            instrumentation.count("lines_seen")
         
-        doc = nlp_model(line)
-        
-        lab = {}
-        for ent in doc.ents:
-            if ent.label_ == "TEST_NAME" and "test" not in lab:
-                lab["test"] = ent.text
-            
-            elif ent.label_ == "TEST_VALUE" and "value" not in lab:
-                try:
-                    lab["value"] = float(ent.text)
-                except ValueError:
-                    pass
-            elif ent.label_ == "UNIT" and "unit" not in lab:
-                lab["unit"] = ent.text.rstrip('.')
-            elif ent.label_ == "FLAG":
-                lab["flag"] = ent.text
+        path, spans = _resolve_line(line, memo, rules, prefilter)
+        if path == "filtered":
+            if prefilter.parity:
+                prefilter.check_parity(line, lab_from_spans(line, doc_spans(nlp_model(line))))
+            continue
+        if spans is None:
+            if instrumentation is None:
+                doc = nlp_model(line)
+            else:
+                instrumentation.count("lines_sent_to_ner")
+                with instrumentation.timer("model_call"):
+                    doc = nlp_model(line)
+            spans = doc_spans(doc)
+            if memo is not None:
+                memo.put(line, spans)
         
+        lab = lab_from_spans(line, spans)
+        if instrumentation is not None:
+            instrumentation.count("entities", len(spans))
         if lab.get("test"):
-            flag_match = re.search(r'Marked as ([HL])', line)
-            if flag_match:
-                lab["flag"] = flag_match.group(1)
-            
-            ref_match = re.search(r'compared to normal ([\d.-]+)', line)
-            if ref_match:
-                lab["reference"] = ref_match.group(1).rstrip('.')
-            
             lab_results.append(lab)
     
+    if instrumentation is not None:
+        instrumentation.count("labs", len(lab_results))
     return lab_results
 
-def extract_all(text, nlp_model):
+def extract_lab_results_ner_batch(texts, nlp_model, batch_size=256, memo=None, rules=None, prefilter=None,
+                                  instrumentation=None):
+    """Extract lab results for many reports with a single nlp.pipe pass.
+
+    Each distinct line is sent to the model at most once, and lines
+    filtered out, matched by `rules` or already in `memo` not at all.
+    Returns one list of lab dicts per input text, in input order.
+    """
+    report_index = []
+    lines = []
+    line_spans = {}
+    line_paths = {}
+    for i, text in enumerate(texts):
+        for line in text.split('\n'):
+            line = line.strip()
+            if not line:
+                continue
+            report_index.append(i)
+            lines.append(line)
+            if line in line_paths:
+                _count_repeat(line_paths[line], memo, rules, prefilter)
+            else:
+                line_paths[line], line_spans[line] = _resolve_line(line, memo, rules, prefilter)
+    
+    unseen = [line for line, path in line_paths.items() if path == "model"]
+    with timer_for(instrumentation)("model_batch"):
+        for line, doc in zip(unseen, nlp_model.pipe(unseen, batch_size=batch_size)):
+            line_spans[line] = doc_spans(doc)
+            if memo is not None:
+                memo.put(line, line_spans[line])
+    
+    if prefilter is not None and prefilter.parity:
+        filtered = Counter(line for line in lines if line_paths[line] == "filtered")
+        docs = nlp_model.pipe(filtered, batch_size=batch_size)
+        for line, doc in zip(filtered, docs):
+            prefilter.check_parity(line, lab_from_spans(line, doc_spans(doc)), count=filtered[line])
+    
+    lab_results = [[] for _ in texts]
+    for i, line in zip(report_index, lines):
+        lab = lab_from_spans(line, line_spans[line])
+        if lab.get("test"):
+            lab_results[i].append(lab)
+    
+    if instrumentation is not None:
+        instrumentation.count("lines_seen", len(lines))
+        instrumentation.count("lines_sent_to_ner", len(unseen))
+        instrumentation.count("entities", sum(len(line_spans[line]) for line in lines))
+        instrumentation.count("labs", sum(len(labs) for labs in lab_results))
+    return lab_results
+
+def extract_all(text, nlp_model, memo=None, rules=None, prefilter=None, instrumentation=None):
+    """Segment the report once and run each extractor on its own section.
+
+    With an ExtractionInstrumentation, each extractor is timed.
+    """
+    timer = timer_for(instrumentation)
+    with timer("extract_all"):
+        with timer("segment"):
+            sections = report_sections(text)
+        with timer("header"):
+            patient = extract_patient_info(sections["header"])
+        with timer("labs"):
+            labs = extract_lab_results_ner(sections["labs"], nlp_model, memo=memo, rules=rules,
+                                           prefilter=prefilter, instrumentation=instrumentation)
+        with timer("diagnosis"):
+            diagnosis = extract_diagnosis(sections["diagnosis"])
+        with timer("medications"):
+            medications = extract_medications(sections["medications"])
+    if instrumentation is not None:
+        instrumentation.count("reports")
     return {
-        "patient": extract_patient_info(text),
-        "labs": extract_lab_results_ner(text, nlp_model),
-        "diagnosis": extract_diagnosis(text),
-        "medications": extract_medications(text)
+        "patient": patient,
+        "labs": labs,
+        "diagnosis": diagnosis,
+        "medications": medications
     }
 
-text = """Hospital: Flores, Willis and Doyle Hospital
+def extract_all_batch(texts, nlp_model, batch_size=256, memo=None, rules=None, prefilter=None,
+                      instrumentation=None):
+    """Batched extract_all: same per-report dicts, NER run via nlp.pipe."""
+    timer = timer_for(instrumentation)
+    all_sections = []
+    for text in texts:
+        with timer("segment"):
+            all_sections.append(report_sections(text))
+    with timer("labs_batch"):
+        all_labs = extract_lab_results_ner_batch([sections["labs"] for sections in all_sections], nlp_model,
+                                                 batch_size=batch_size, memo=memo, rules=rules,
+                                                 prefilter=prefilter, instrumentation=instrumentation)
+    results = []
+    for sections, labs in zip(all_sections, all_labs):
+        with timer("header"):
+            patient = extract_patient_info(sections["header"])
+        with timer("diagnosis"):
+            diagnosis = extract_diagnosis(sections["diagnosis"])
+        with timer("medications"):
+            medications = extract_medications(sections["medications"])
+        results.append({
+            "patient": patient,
+            "labs": labs,
+            "diagnosis": diagnosis,
+            "medications": medications
+        })
+    if instrumentation is not None:
+        instrumentation.count("reports", len(texts))
+    return results
+
+if __name__ == "__main__":
+    text = """Hospital: Flores, Willis and Doyle Hospital
 Patient: Alexis Vance, ID HSP13997, Age 24, Gender Female
 Consulting Doctor: Dr. Alexander Miller, Date: 2025-11-15
 Some values may vary depending on lab equipment calibration.
@@ -230,18 +539,15 @@ Medications prescribed:
  - Atorvastatin 20 mg, HS
 Doctor advised proper rest and hydration."""
 
-#info = extract_patient_info(text)
-#pprint(info)
-
-
-sample = "Haemoglobin (g/dL) came out to be 8.63 g/dL, compared to normal 12.0-16.0. Marked as L."
-entities = find_test_names(sample)
-entities.extend(find_test_values(sample))
-entities.extend(find_units(sample))
-entities.extend(find_flags(sample))
-entities.sort(key=lambda x: x[0])
-
+    #info = extract_patient_info(text)
+    #pprint(info)
     
-for start, end, label in entities:
-    print(f"{label}: '{sample[start:end]}'")
-    
\ No newline at end of file
+    sample = "Haemoglobin (g/dL) came out to be 8.63 g/dL, compared to normal 12.0-16.0. Marked as L."
+    entities = find_test_names(sample)
+    entities.extend(find_test_values(sample))
+    entities.extend(find_units(sample))
+    entities.extend(find_flags(sample))
+    entities.sort(key=lambda x: x[0])
+    
+    for start, end, label in entities:
+        print(f"{label}: '{sample[start:end]}'")
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+from glob import glob
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Files whose contents change what extract_all returns for the same text.
+EXTRACTION_CODE_FILES = [
+    os.path.join(SRC_DIR, "extraction.py"),
+    os.path.join(SRC_DIR, "gazetteer.py"),
+    os.path.join(SRC_DIR, "lab_rules.py"),
+    os.path.join(SRC_DIR, "ner_memo.py"),
+    os.path.join(SRC_DIR, "line_prefilter.py"),
+    os.path.join(SRC_DIR, "..", "data", "lab_vocabulary.json"),
+]
+
+def _hash_files(paths, root):
+    """Hash names (relative to `root`, so the working directory doesn't matter) and contents."""
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.relpath(path, root).encode("utf-8"))
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+def model_fingerprint(model_path):
+    """Hash a model directory: config.cfg, weights and vocab files."""
+    paths = sorted(p for p in glob(os.path.join(model_path, "**"), recursive=True) if os.path.isfile(p))
+    return _hash_files(paths, model_path)
+
+def code_fingerprint():
+    """Hash the extraction code so a code change invalidates old entries."""
+    return _hash_files([p for p in EXTRACTION_CODE_FILES if os.path.exists(p)], SRC_DIR)
+
+def extraction_options(use_rules=False, prefilter_checks=None):
+    """The `options` string for ExtractionCache; every entry point builds it here so they share entries.
+
+    Only settings that change extract_all's output belong here; the
+    memo and batch sizes don't, so they are left out.
+    """
+    return f"rules={use_rules};prefilter={prefilter_checks}"
+
+class ExtractionCache:
+    """On-disk cache of extract_all results keyed by report content.
+
+    Keys combine a hash of the report text with fingerprints of the model,
+    the extraction code and any `options` string that changes the output.
+    Entries are one JSON file each; once the cache grows past `max_bytes`
+    the least recently used entries are evicted.
+    """
+
+    def __init__(self, model_path, cache_dir="cache/extraction", max_bytes=512 * 1024 * 1024, options=""):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.namespace = hashlib.sha256(
+            (model_fingerprint(model_path) + code_fingerprint() + options).encode("utf-8")
+        ).hexdigest()[:16]
+        
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        
+        os.makedirs(cache_dir, exist_ok=True)
+        self.total_bytes = sum(os.path.getsize(p) for p in self._entry_paths())
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def _entry_paths(self):
+        return glob(os.path.join(self.cache_dir, "*", "*", "*.json"))
+
+    def _path(self, text):
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, self.namespace, key[:2], key + ".json")
+
+    def get(self, text):
+        """Return the cached extraction for `text`, or None."""
+        path = self._path(text)
+        try:
+            with open(path, "r") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        
+        os.utime(path)
+        self.hits += 1
+        self.bytes_read += len(raw)
+        return json.loads(raw)
+
+    def put(self, text, extracted):
+        path = self._path(text)
+        raw = json.dumps(extracted, separators=(",", ":"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        
+        try:
+            replaced = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced = 0
+        
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(raw)
+        os.replace(tmp_path, path)
+        
+        self.writes += 1
+        self.bytes_written += len(raw)
+        self.total_bytes += len(raw) - replaced
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Drop least recently used entries until the cache is 90% of max_bytes."""
+        entries = []
+        for path in self._entry_paths():
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        
+        self.total_bytes = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if self.total_bytes <= target:
+                break
+            os.remove(path)
+            self.total_bytes -= size
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "cache_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def report(self):
+        stats = self.stats()
+        print(f"Extraction cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"({stats['hit_rate']:.1%} hit rate), {stats['writes']} writes, "
+              f"{stats['evictions']} evictions, {stats['cache_bytes'] / 1024:.1f} KiB on disk")
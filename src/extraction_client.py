@@ -0,0 +1,82 @@
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import Request, urlopen
+
+class ExtractionClient:
+    """Small client for extraction_server; no spaCy import or model load on this side."""
+
+    def __init__(self, base_url="http://127.0.0.1:8765", timeout=60.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, path, payload=None):
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        request = Request(self.base_url + path, data=data,
+                          headers={"Content-Type": "application/json"} if data else {})
+        with urlopen(request, timeout=self.timeout) as response:
+            return response.read().decode("utf-8")
+
+    def extract(self, text):
+        """Extract one report; returns the same dict as extraction.extract_all."""
+        return json.loads(self._request("/extract", {"text": text}))["result"]
+
+    def extract_many(self, texts):
+        """Extract several reports in one request; results are in input order."""
+        return json.loads(self._request("/extract", {"texts": list(texts)}))["results"]
+
+    def health(self):
+        return json.loads(self._request("/health"))
+
+    def metrics(self, fmt="prometheus"):
+        """Prometheus text, or a dict with fmt="json"."""
+        if fmt == "json":
+            return json.loads(self._request("/metrics?format=json"))
+        return self._request("/metrics")
+
+def load_check(base_url, texts, clients=50, requests=300, timeout=60.0):
+    """Send `requests` single-report /extract calls from `clients` threads at once.
+
+    Each thread opens its own connections, as separate callers would, so
+    this exercises the server's listen backlog as well as micro-batching.
+    Returns counts of successes and failures by error type, and elapsed time.
+    """
+    client = ExtractionClient(base_url, timeout)
+    failures = {}
+
+    def call(i):
+        try:
+            client.extract(texts[i % len(texts)])
+            return None
+        except Exception as e:
+            return type(e).__name__
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        for error in pool.map(call, range(requests)):
+            if error is not None:
+                failures[error] = failures.get(error, 0) + 1
+    return {
+        "requests": requests,
+        "clients": clients,
+        "succeeded": requests - sum(failures.values()),
+        "failures": failures,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+if __name__ == "__main__":
+    from preprocessing import iter_reports
+
+    parser = argparse.ArgumentParser(description="Load-check a running extraction server.")
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--folder", default="data/Test", help="Reports to send, cycled")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+
+    texts = [text for _, text in iter_reports(args.folder)]
+    result = load_check(args.url, texts, args.clients, args.requests)
+    print(json.dumps(result, indent=2))
+    if result["failures"]:
+        raise SystemExit(1)
@@ -0,0 +1,266 @@
+import argparse
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from extraction import extract_all_batch
+from instrumentation import ExtractionInstrumentation
+from lab_rules import LabLineRules
+from line_prefilter import LinePrefilter
+from model_loader import MODEL_CACHE_DIR, load_ner_model
+from ner_memo import LineEntityMemo
+
+DEFAULT_BACKLOG = 128
+
+class MicroBatcher:
+    """Coalesce concurrent extraction requests into extract_all_batch calls.
+
+    A single thread owns the model. It takes the first queued request,
+    then keeps collecting for up to `max_wait` seconds or until
+    `max_batch` reports are pending, and runs them through one
+    nlp.pipe pass. Each request gets a Future for its own results.
+    """
+
+    def __init__(self, nlp, max_batch=32, max_wait=0.01, batch_size=256, memo=None, rules=None,
+                 prefilter=None, instrumentation=None):
+        self.nlp = nlp
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batch_size = batch_size
+        self.memo = memo
+        self.rules = rules
+        self.prefilter = prefilter
+        self.instrumentation = instrumentation
+        self.queue = queue.Queue()
+        self.requests = 0
+        self.reports = 0
+        self.batches = 0
+        self.errors = 0
+        self.snapshot = instrumentation.stats() if instrumentation is not None else None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, texts):
+        """Queue a list of report texts; the Future resolves to their extracted dicts."""
+        future = Future()
+        self.queue.put((list(texts), future))
+        return future
+
+    def _collect(self, first):
+        pending = [first]
+        count = len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while count < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self.queue.put(None)
+                break
+            pending.append(item)
+            count += len(item[0])
+        return pending
+
+    def _run(self):
+        while True:
+            first = self.queue.get()
+            if first is None:
+                return
+            pending = self._collect(first)
+            texts = [text for request_texts, _ in pending for text in request_texts]
+            try:
+                results = extract_all_batch(texts, self.nlp, batch_size=self.batch_size, memo=self.memo,
+                                            rules=self.rules, prefilter=self.prefilter,
+                                            instrumentation=self.instrumentation)
+            except Exception as e:
+                self.errors += len(pending)
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for request_texts, future in pending:
+                future.set_result(results[offset:offset + len(request_texts)])
+                offset += len(request_texts)
+            self.requests += len(pending)
+            self.reports += len(texts)
+            self.batches += 1
+            if self.instrumentation is not None:
+                self.snapshot = self.instrumentation.stats()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "reports": self.reports,
+            "batches": self.batches,
+            "errors": self.errors,
+            "avg_batch_reports": self.reports / self.batches if self.batches else 0,
+            "queue_depth": self.queue.qsize(),
+        }
+
+class ExtractionHandler(BaseHTTPRequestHandler):
+    """HTTP front end for a MicroBatcher.
+
+    POST /extract with {"text": ...} returns {"result": {...}}, and with
+    {"texts": [...]} returns {"results": [...]}. GET /health reports
+    readiness and GET /metrics serves Prometheus text (or JSON with
+    ?format=json).
+    """
+
+    batcher = None
+    model_path = None
+    started = None
+    request_timeout = 60.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload).encode("utf-8"), "application/json")
+
+    def _metrics(self):
+        server = self.batcher.stats()
+        snapshot = self.batcher.snapshot
+        instrumentation = ExtractionInstrumentation.from_stats(snapshot) if snapshot else None
+        return server, instrumentation
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = url.path.rstrip("/")
+        if path == "/health":
+            self._send_json(200, {
+                "status": "ok",
+                "model": self.model_path,
+                "uptime_seconds": round(time.monotonic() - self.started, 1),
+                "queue_depth": self.batcher.queue.qsize(),
+            })
+        elif path == "/metrics":
+            server, instrumentation = self._metrics()
+            if parse_qs(url.query).get("format") == ["json"]:
+                payload = {"server": server}
+                if instrumentation is not None:
+                    payload["extraction"] = instrumentation.to_json()
+                self._send_json(200, payload)
+                return
+            lines = []
+            for name, value in server.items():
+                metric_type = "gauge" if name in ("avg_batch_reports", "queue_depth") else "counter"
+                metric = f"mediq_server_{name}" + ("_total" if metric_type == "counter" else "")
+                lines.append(f"# TYPE {metric} {metric_type}")
+                lines.append(f"{metric} {value}")
+            body = "\n".join(lines) + "\n"
+            if instrumentation is not None:
+                body += instrumentation.to_prometheus()
+            self._send(200, body.encode("utf-8"), "text/plain; version=0.0.4")
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if urlparse(self.path).path.rstrip("/") != "/extract":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "request body must be JSON"})
+            return
+
+        if not isinstance(request, dict):
+            request = {}
+
+        single = "text" in request
+        texts = [request["text"]] if single else request.get("texts")
+        if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+            self._send_json(400, {"error": "expected {\"text\": str} or {\"texts\": [str, ...]}"})
+            return
+
+        try:
+            results = self.batcher.submit(texts).result(timeout=self.request_timeout)
+        except Exception as e:
+            self._send_json(500, {"error": f"extraction failed: {e}"})
+            return
+        self._send_json(200, {"result": results[0]} if single else {"results": results})
+
+def start_extraction_server(model_path="medical_ner_model_v2", host="127.0.0.1", port=8765, max_batch=32,
+                            max_wait=0.01, batch_size=256, memo_size=100_000, use_rules=False,
+                            prefilter_checks=None, instrument=True, model_cache_dir=None, backlog=DEFAULT_BACKLOG):
+    """Load the model once and serve it in a background thread; returns (server, base_url).
+
+    `backlog` is the listen queue length. The socketserver default of 5
+    resets connections as soon as a few dozen clients connect at once.
+    """
+    nlp = load_ner_model(model_path, cache_dir=model_cache_dir)
+    batcher = MicroBatcher(
+        nlp, max_batch=max_batch, max_wait=max_wait, batch_size=batch_size,
+        memo=LineEntityMemo(memo_size) if memo_size else None,
+        rules=LabLineRules() if use_rules else None,
+        prefilter=LinePrefilter(prefilter_checks) if prefilter_checks else None,
+        instrumentation=ExtractionInstrumentation() if instrument else None
+    )
+    handler = type("ConfiguredExtractionHandler", (ExtractionHandler,), {
+        "batcher": batcher,
+        "model_path": model_path,
+        "started": time.monotonic(),
+    })
+    server_class = type("ExtractionHTTPServer", (ThreadingHTTPServer,), {
+        "request_queue_size": backlog,
+        "daemon_threads": True,
+    })
+    server = server_class((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resident extraction server with request micro-batching.")
+    parser.add_argument("--model", default="medical_ner_model_v2")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch", type=int, default=32, help="Reports per micro-batch")
+    parser.add_argument("--max-wait-ms", type=float, default=10,
+                        help="How long the first request in a batch waits for company")
+    parser.add_argument("--batch-size", type=int, default=256, help="Lines per nlp.pipe batch")
+    parser.add_argument("--memo-size", type=int, default=100_000,
+                        help="Distinct lines memoized (0 disables)")
+    parser.add_argument("--rules", action="store_true",
+                        help="Label templated lab lines with rules, NER only as fallback")
+    parser.add_argument("--prefilter", default=None,
+                        help="Comma-separated line checks before NER, e.g. digit,gazetteer")
+    parser.add_argument("--no-instrument", action="store_true",
+                        help="Skip hot-path counters and latency histograms in /metrics")
+    parser.add_argument("--backlog", type=int, default=DEFAULT_BACKLOG,
+                        help="Listen queue length for pending connections")
+    parser.add_argument("--model-cache", action="store_true",
+                        help=f"Warm-start the model from a serialized copy in {MODEL_CACHE_DIR}")
+    args = parser.parse_args()
+
+    server, base_url = start_extraction_server(
+        args.model, args.host, args.port, max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000,
+        batch_size=args.batch_size, memo_size=args.memo_size, use_rules=args.rules,
+        prefilter_checks=tuple(args.prefilter.split(",")) if args.prefilter else None,
+        instrument=not args.no_instrument, model_cache_dir=MODEL_CACHE_DIR if args.model_cache else None,
+        backlog=args.backlog
+    )
+    print(f"Extraction server at {base_url} (POST /extract, GET /health, GET /metrics)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,92 @@
+import json
+import os
+import re
+from functools import lru_cache
+
+DEFAULT_VOCABULARY_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "lab_vocabulary.json")
+
+# A term only matches when it is not glued to other letters, so "Hb" never
+# fires inside "Hbs" while units still match right after a number ("8.6g/dL").
+NOT_LETTER_BEFORE = r'(?<![^\W\d_])'
+NOT_LETTER_AFTER = r'(?![^\W\d_])'
+
+def _build_trie(terms, case_sensitive):
+    trie = {}
+    for term in terms:
+        node = trie
+        for ch in (term if case_sensitive else term.lower()):
+            node = node.setdefault(ch, {})
+        node[''] = True
+    return trie
+
+def _trie_to_regex(node):
+    """Turn a character trie into a regex that prefers the longest term."""
+    alternatives = [re.escape(ch) + _trie_to_regex(child) for ch, child in sorted(node.items()) if ch]
+    if not alternatives:
+        return ''
+    pattern = alternatives[0] if len(alternatives) == 1 else '(?:' + '|'.join(alternatives) + ')'
+    if '' in node:
+        pattern = '(?:' + pattern + ')?'
+    return pattern
+
+class Gazetteer:
+    """Dictionary matcher for test names, aliases and units.
+
+    `vocabulary` maps a label to {canonical term: [aliases]}. All terms
+    are compiled once into a trie-shaped regex, so a single scan finds
+    every match regardless of how many terms there are.
+    """
+
+    def __init__(self, vocabulary, case_sensitive=False):
+        self.case_sensitive = case_sensitive
+        self.canonical_names = {}
+        self.term_labels = {}
+        
+        branches = []
+        for label, entries in vocabulary.items():
+            terms = []
+            for canonical, aliases in entries.items():
+                for term in [canonical, *aliases]:
+                    terms.append(term)
+                    self.canonical_names[self._key(term)] = canonical
+                    self.term_labels[self._key(term)] = label
+            trie_pattern = _trie_to_regex(_build_trie(terms, case_sensitive))
+            branches.append(f'(?P<{label}>{trie_pattern})')
+        
+        flags = 0 if case_sensitive else re.IGNORECASE
+        self.pattern = re.compile(
+            NOT_LETTER_BEFORE + '(?:' + '|'.join(branches) + ')' + NOT_LETTER_AFTER, flags
+        )
+        self.labels = tuple(vocabulary)
+
+    @classmethod
+    def from_file(cls, path, case_sensitive=False):
+        with open(path, 'r') as f:
+            return cls(json.load(f), case_sensitive=case_sensitive)
+
+    def _key(self, term):
+        return term if self.case_sensitive else term.lower()
+
+    def find(self, text, label=None):
+        """Return (start, end, label) for every match, optionally for one label."""
+        entities = []
+        for match in self.pattern.finditer(text):
+            if label is None or match.lastgroup == label:
+                entities.append((match.start(), match.end(), match.lastgroup))
+        return entities
+
+    def contains_match(self, text):
+        return self.pattern.search(text) is not None
+
+    def canonical(self, term):
+        """Map a term or alias to its canonical name, or None if unknown."""
+        return self.canonical_names.get(self._key(term.strip()))
+
+    def label(self, term):
+        """Return the label of a known term or alias, or None if unknown."""
+        return self.term_labels.get(self._key(term.strip()))
+
+@lru_cache(maxsize=None)
+def load_gazetteer(path=DEFAULT_VOCABULARY_PATH):
+    """Load and compile a vocabulary file once per process."""
+    return Gazetteer.from_file(path)
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import time
+from gazetteer import load_gazetteer
+
+def bucket_value(value, significant_digits):
+    """Round a lab value to a number of significant digits (e.g. 2: 8.63 -> 8.6)."""
+    if significant_digits is None or not isinstance(value, (int, float)):
+        return value
+    return float(f"{value:.{significant_digits}g}")
+
+def insight_signature(patient_data, significant_digits=None):
+    """Canonical description of what the insight prompt depends on.
+
+    Abnormal labs are reduced to canonical test name, flag, unit and
+    (optionally bucketed) value and sorted, and diagnoses are sorted, so
+    patients with the same profile share a signature regardless of
+    report order or test-name aliases.
+    """
+    gazetteer = load_gazetteer()
+    labs = []
+    for lab in patient_data.get('labs', []):
+        if lab.get('flag') not in ['H', 'L']:
+            continue
+        test = lab.get('test', '')
+        labs.append({
+            'test': gazetteer.canonical(test) or test,
+            'flag': lab['flag'],
+            'unit': lab.get('unit'),
+            'value': bucket_value(lab.get('value'), significant_digits),
+        })
+    labs.sort(key=lambda lab: (lab['test'], lab['flag'], str(lab['value'])))
+    return {'labs': labs, 'diagnosis': sorted(patient_data.get('diagnosis', []))}
+
+class InsightCache:
+    """Persistent cache of LLM insights keyed by a prompt fingerprint.
+
+    The fingerprint hashes the insight signature together with the model
+    name, token limit and prompt version, so a change to any of them
+    starts fresh. Entries older than `ttl_seconds` expire, and beyond
+    `max_entries` the least recently used are dropped.
+    """
+
+    def __init__(self, cache_file="output/insight_cache.json", significant_digits=None,
+                 ttl_seconds=30 * 24 * 3600, max_entries=50_000, namespace=""):
+        self.cache_file = cache_file
+        self.significant_digits = significant_digits
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        
+        self.entries = {}
+        if os.path.exists(cache_file):
+            with open(cache_file, 'r') as f:
+                self.entries = json.load(f)
+        self._drop_expired()
+
+    def key(self, patient_data):
+        signature = insight_signature(patient_data, self.significant_digits)
+        payload = json.dumps([self.namespace, self.significant_digits, signature], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _drop_expired(self):
+        if self.ttl_seconds is None:
+            return
+        cutoff = time.time() - self.ttl_seconds
+        stale = [key for key, entry in self.entries.items() if entry['created'] < cutoff]
+        for key in stale:
+            del self.entries[key]
+        self.expired += len(stale)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None and self.ttl_seconds is not None and entry['created'] < time.time() - self.ttl_seconds:
+            del self.entries[key]
+            self.expired += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        entry['last_used'] = time.time()
+        self.hits += 1
+        return entry['insights']
+
+    def put(self, key, insights):
+        now = time.time()
+        self.entries[key] = {'insights': insights, 'created': now, 'last_used': now}
+        if len(self.entries) > self.max_entries:
+            by_age = sorted(self.entries, key=lambda k: self.entries[k]['last_used'])
+            for old_key in by_age[:len(self.entries) - self.max_entries]:
+                del self.entries[old_key]
+                self.evictions += 1
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.cache_file) or ".", exist_ok=True)
+        tmp_file = self.cache_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_file, self.cache_file)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0,
+            "entries": len(self.entries),
+            "expired": self.expired,
+            "evictions": self.evictions,
+        }
+
+    def report(self):
+        stats = self.stats()
+        print(f"Insight cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"({stats['hit_rate']:.1%} hit rate), {stats['entries']} entries, "
+              f"{stats['expired']} expired, {stats['evictions']} evicted")
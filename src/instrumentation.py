@@ -0,0 +1,166 @@
+import json
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+
+# Histogram upper bounds in seconds (Prometheus defaults plus sub-millisecond buckets).
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNTERS = ("reports", "lines_seen", "lines_sent_to_ner", "entities", "labs")
+PROMETHEUS_PREFIX = "mediq_extraction"
+
+_NULL_TIMER = nullcontext()
+
+def _null_timer(name):
+    return _NULL_TIMER
+
+def timer_for(instrumentation):
+    """Return instrumentation.timer, or a no-op timer when instrumentation is None."""
+    return _null_timer if instrumentation is None else instrumentation.timer
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (per-bucket counts, not cumulative)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def cumulative(self):
+        """(upper bound, observations <= bound) pairs, ending with +Inf."""
+        running = 0
+        pairs = []
+        for bound, count in zip(list(self.buckets) + [float("inf")], self.counts):
+            running += count
+            pairs.append((bound, running))
+        return pairs
+
+class _Timer:
+    __slots__ = ("instrumentation", "name", "started")
+
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.instrumentation.observe(self.name, time.perf_counter() - self.started)
+        return False
+
+class ExtractionInstrumentation:
+    """Opt-in counters and latency histograms for the extraction hot path.
+
+    Pass one as `instrumentation` to extract_all / extract_all_batch.
+    Stages are timed with `timer(name)`: segment, header, labs,
+    diagnosis, medications and extract_all per report, model_call per
+    single-line NER call, and labs_batch / model_batch per batch in the
+    batched path. Each observation is also passed to every
+    `callbacks(name, seconds)`. When no instance is passed, the
+    extractors only pay an `is None` check.
+    """
+
+    def __init__(self, callbacks=()):
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.histograms = {}
+        self.callbacks = list(callbacks)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, seconds):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        histogram.observe(seconds)
+        for callback in self.callbacks:
+            callback(name, seconds)
+
+    def timer(self, name):
+        return _Timer(self, name)
+
+    def stats(self):
+        """Flat numeric dict, so counters from several workers can simply be summed."""
+        stats = dict(self.counters)
+        for name, histogram in self.histograms.items():
+            stats[f"latency:{name}:count"] = histogram.count
+            stats[f"latency:{name}:sum"] = histogram.sum
+            for bound, count in zip(list(histogram.buckets) + ["inf"], histogram.counts):
+                stats[f"latency:{name}:bucket:{bound}"] = count
+        return stats
+
+    @classmethod
+    def from_stats(cls, stats):
+        """Rebuild an instance from (possibly summed) `stats()` output."""
+        instrumentation = cls()
+        bucket_index = {str(bound): i for i, bound in enumerate(LATENCY_BUCKETS)}
+        bucket_index["inf"] = len(LATENCY_BUCKETS)
+        for key, value in stats.items():
+            if not key.startswith("latency:"):
+                instrumentation.counters[key] = value
+                continue
+            _, name, field, *bound = key.split(":")
+            histogram = instrumentation.histograms.setdefault(name, LatencyHistogram())
+            if field == "count":
+                histogram.count = value
+            elif field == "sum":
+                histogram.sum = value
+            else:
+                histogram.counts[bucket_index[bound[0]]] = value
+        return instrumentation
+
+    def to_json(self):
+        return {
+            "counters": dict(self.counters),
+            "latency_seconds": {
+                name: {
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "mean": histogram.sum / histogram.count if histogram.count else 0,
+                    "buckets": {("+Inf" if bound == float("inf") else str(bound)): count
+                                for bound, count in histogram.cumulative()}
+                }
+                for name, histogram in self.histograms.items()
+            }
+        }
+
+    def to_prometheus(self, prefix=PROMETHEUS_PREFIX):
+        """Prometheus text exposition format."""
+        lines = []
+        for name, value in self.counters.items():
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        if self.histograms:
+            metric = f"{prefix}_stage_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            for name, histogram in self.histograms.items():
+                for bound, count in histogram.cumulative():
+                    le = "+Inf" if bound == float("inf") else str(bound)
+                    lines.append(f'{metric}_bucket{{stage="{name}",le="{le}"}} {count}')
+                lines.append(f'{metric}_sum{{stage="{name}"}} {histogram.sum}')
+                lines.append(f'{metric}_count{{stage="{name}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def save(self, path, fmt="json"):
+        with open(path, "w") as f:
+            if fmt == "prometheus":
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.to_json(), f, indent=2)
+
+    def report(self):
+        counters = self.counters
+        print(f"Instrumentation: {counters['reports']} reports, {counters['lines_seen']} lab lines, "
+              f"{counters['lines_sent_to_ner']} sent to NER, {counters['entities']} entities, "
+              f"{counters['labs']} labs")
+        for name, histogram in self.histograms.items():
+            if histogram.count:
+                print(f"  {name}: {histogram.count} x {histogram.sum / histogram.count * 1000:.3f}ms avg")
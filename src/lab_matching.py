@@ -0,0 +1,143 @@
+from gazetteer import load_gazetteer
+
+# Same cut-off evaluate.fuzzy_match used for test names, as a normalised edit distance.
+NAME_SIMILARITY_THRESHOLD = 0.85
+
+def normalize_test_name(name):
+    """Map a test name or alias to one comparable key (canonical name, lower-cased)."""
+    name = str(name).strip()
+    canonical = load_gazetteer().canonical(name)
+    return (canonical or name).lower()
+
+def bounded_edit_distance(a, b, max_distance):
+    """Levenshtein distance between a and b, or None if it exceeds max_distance.
+
+    Only a diagonal band of width 2 * max_distance + 1 is computed, and
+    the scan stops as soon as every cell in a row is over the bound.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+    if len(a) > len(b):
+        a, b = b, a
+    
+    over = max_distance + 1
+    previous = [j if j <= max_distance else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [over] * (len(b) + 1)
+        if i <= max_distance:
+            current[0] = i
+        low = max(1, i - max_distance)
+        high = min(len(b), i + max_distance)
+        for j in range(low, high + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost, over)
+        if min(current[low - 1:high + 1]) > max_distance:
+            return None
+        previous = current
+    return previous[len(b)] if previous[len(b)] <= max_distance else None
+
+def _min_cost_assignment(cost):
+    """Hungarian algorithm: row -> column assignment minimising total cost.
+
+    `cost` is a rectangular list of lists with rows <= columns.
+    """
+    n, m = len(cost), len(cost[0])
+    inf = float('inf')
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    p = [0] * (m + 1)
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            delta = inf
+            j1 = 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    cur = cost[i0 - 1][j - 1] - u[i0] - v[j]
+                    if cur < minv[j]:
+                        minv[j] = cur
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta = minv[j]
+                        j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    return {p[j] - 1: j - 1 for j in range(1, m + 1) if p[j]}
+
+def match_labs(ground_truth_labs, predicted_labs, threshold=NAME_SIMILARITY_THRESHOLD):
+    """Pair ground-truth and predicted labs one-to-one by test name.
+
+    Names are normalised through the gazetteer alias index and paired
+    by exact key first. Leftovers are compared with a bounded edit
+    distance (similarity >= threshold) and paired by an optimal
+    assignment that maximises matches, then minimises total distance.
+    Returns (pairs, unmatched_ground_truth, unmatched_predicted).
+    """
+    gt_labs = list({lab['test']: lab for lab in ground_truth_labs}.values())
+    pred_labs = list({lab['test']: lab for lab in predicted_labs}.values())
+    
+    pred_index = {}
+    for j, lab in enumerate(pred_labs):
+        pred_index.setdefault(normalize_test_name(lab['test']), []).append(j)
+    
+    pairs = []
+    used_pred = set()
+    leftover_gt = []
+    for i, lab in enumerate(gt_labs):
+        candidates = [j for j in pred_index.get(normalize_test_name(lab['test']), []) if j not in used_pred]
+        if candidates:
+            used_pred.add(candidates[0])
+            pairs.append((lab, pred_labs[candidates[0]]))
+        else:
+            leftover_gt.append(i)
+    leftover_pred = [j for j in range(len(pred_labs)) if j not in used_pred]
+    
+    if leftover_gt and leftover_pred:
+        gt_keys = [normalize_test_name(gt_labs[i]['test']) for i in leftover_gt]
+        pred_keys = [normalize_test_name(pred_labs[j]['test']) for j in leftover_pred]
+        unmatched_cost = 1_000_000
+        cost = []
+        for gt_key in gt_keys:
+            row = []
+            for pred_key in pred_keys:
+                max_distance = int((1 - threshold) * max(len(gt_key), len(pred_key)) + 1e-9)
+                distance = bounded_edit_distance(gt_key, pred_key, max_distance)
+                row.append(unmatched_cost if distance is None else distance)
+            cost.append(row)
+        
+        transpose = len(cost) > len(cost[0])
+        if transpose:
+            cost = [list(column) for column in zip(*cost)]
+        assignment = _min_cost_assignment(cost)
+        if transpose:
+            assignment = {col: row for row, col in assignment.items()}
+        
+        matched_gt = set()
+        matched_pred = set()
+        for gi, pj in assignment.items():
+            if (cost[pj][gi] if transpose else cost[gi][pj]) >= unmatched_cost:
+                continue
+            pairs.append((gt_labs[leftover_gt[gi]], pred_labs[leftover_pred[pj]]))
+            matched_gt.add(leftover_gt[gi])
+            matched_pred.add(leftover_pred[pj])
+        leftover_gt = [i for i in leftover_gt if i not in matched_gt]
+        leftover_pred = [j for j in leftover_pred if j not in matched_pred]
+    
+    return pairs, [gt_labs[i] for i in leftover_gt], [pred_labs[j] for j in leftover_pred]
@@ -0,0 +1,71 @@
+import re
+from gazetteer import load_gazetteer
+
+NUMBER = r'\d+(?:\.\d+)?'
+TEST = r'(?P<test>[A-Za-z][A-Za-z ]*?) \((?P<unit>[^()\s]+)\)'
+VALUE = rf'(?P<value>{NUMBER}) ?(?P<unit2>(?P=unit))'
+FLAG = r'(?: Marked as (?P<flag>[HL])\.)?$'
+
+# The phrasings data.generate_lab_results emits.
+LAB_LINE_TEMPLATES = [
+    re.compile(rf'{TEST} was measured at {VALUE}\.{FLAG}'),
+    re.compile(rf'Observed {TEST}: {VALUE}\.{FLAG}'),
+    re.compile(rf'{TEST} came out to be {VALUE}, compared to normal (?P<low>{NUMBER})-(?P<high>{NUMBER})\.{FLAG}'),
+    re.compile(rf'Lab recorded {TEST} value of {VALUE}\.{FLAG}'),
+]
+SPAN_LABELS = [
+    ("test", "TEST_NAME"),
+    ("unit", "UNIT"),
+    ("value", "TEST_VALUE"),
+    ("unit2", "UNIT"),
+    ("low", "TEST_VALUE"),
+    ("high", "TEST_VALUE"),
+    ("flag", "FLAG"),
+]
+
+class LabLineRules:
+    """Template matcher that labels well-formed lab lines without the NER model.
+
+    `match` returns the same (start, end, label) spans the model would
+    produce, or None when no template recognises the line and it has to
+    fall back to NER. Counters record how many lines took each path.
+    """
+
+    def __init__(self, templates=LAB_LINE_TEMPLATES, gazetteer=None):
+        self.templates = templates
+        self.gazetteer = gazetteer or load_gazetteer()
+        self.rule_lines = 0
+        self.fallback_lines = 0
+
+    def _spans(self, line):
+        for template in self.templates:
+            match = template.match(line)
+            if match is None:
+                continue
+            if self.gazetteer.label(match.group("test")) != "TEST_NAME":
+                continue
+            if self.gazetteer.label(match.group("unit")) != "UNIT":
+                continue
+            groups = match.groupdict()
+            return tuple(
+                (match.start(group), match.end(group), label)
+                for group, label in SPAN_LABELS
+                if groups.get(group) is not None
+            )
+        return None
+
+    def match(self, line):
+        spans = self._spans(line)
+        if spans is None:
+            self.fallback_lines += 1
+        else:
+            self.rule_lines += 1
+        return spans
+
+    def stats(self):
+        total = self.rule_lines + self.fallback_lines
+        return {
+            "rule_lines": self.rule_lines,
+            "ner_fallback_lines": self.fallback_lines,
+            "rule_share": self.rule_lines / total if total else 0,
+        }
@@ -0,0 +1,67 @@
+import re
+from gazetteer import load_gazetteer
+
+DIGIT_PATTERN = re.compile(r'\d')
+
+def has_digit(line):
+    return DIGIT_PATTERN.search(line) is not None
+
+def has_unit(line):
+    return bool(load_gazetteer().find(line, "UNIT"))
+
+def has_gazetteer_hit(line):
+    """True if the line mentions any known test name, alias or unit."""
+    return load_gazetteer().contains_match(line)
+
+PREFILTER_CHECKS = {
+    "digit": has_digit,
+    "unit": has_unit,
+    "gazetteer": has_gazetteer_hit,
+}
+
+class LinePrefilter:
+    """Cheap checks that decide whether a line is worth sending to NER.
+
+    `checks` are names from PREFILTER_CHECKS or callables taking a line;
+    a line passes only if every check does. With `parity=True`, filtered
+    lines are still run through the model and any lab they would have
+    produced is counted in `parity_misses`, so a filter setup can be
+    validated before it is trusted.
+    """
+
+    def __init__(self, checks=("digit", "gazetteer"), parity=False):
+        self.checks = [PREFILTER_CHECKS[check] if isinstance(check, str) else check for check in checks]
+        self.parity = parity
+        self.passed_lines = 0
+        self.filtered_lines = 0
+        self.parity_checked = 0
+        self.parity_misses = 0
+        self.parity_examples = []
+
+    def passes(self, line):
+        passed = all(check(line) for check in self.checks)
+        if passed:
+            self.passed_lines += 1
+        else:
+            self.filtered_lines += 1
+        return passed
+
+    def check_parity(self, line, lab, count=1):
+        """Record whether a filtered line would have produced a lab."""
+        self.parity_checked += count
+        if lab.get("test"):
+            self.parity_misses += count
+            if len(self.parity_examples) < 20:
+                self.parity_examples.append(line)
+
+    def stats(self):
+        total = self.passed_lines + self.filtered_lines
+        stats = {
+            "passed_lines": self.passed_lines,
+            "filtered_lines": self.filtered_lines,
+            "filtered_share": self.filtered_lines / total if total else 0,
+        }
+        if self.parity:
+            stats["parity_checked"] = self.parity_checked
+            stats["parity_misses"] = self.parity_misses
+        return stats
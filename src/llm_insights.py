@@ -1,22 +1,57 @@
-from openai import OpenAI
-from dotenv import load_dotenv
+import argparse
+import asyncio
+import hashlib
 import json
 import os
+import random
+import time
+from insight_cache import InsightCache
+from llm_prompts import LLMMetrics, compact_json, compact_labs, count_tokens
 
-load_dotenv()
+MODEL_NAME = "gpt-4o-mini"
+INSIGHT_MAX_TOKENS = 300
+# Input tokens allowed per request; extra labs (or batch members) are left out.
+INSIGHT_PROMPT_TOKEN_BUDGET = 2000
+# Bump when build_insight_prompt changes so cached responses are not reused.
+INSIGHT_PROMPT_VERSION = "2"
+INSIGHT_CACHE_NAMESPACE = f"{MODEL_NAME}:{INSIGHT_MAX_TOKENS}:{INSIGHT_PROMPT_VERSION}"
 
-def generate_diagnostic_insights(patient_data, api_key):
-    """Generate diagnostic insights from structured patient data."""
-    
-    client = OpenAI(api_key=api_key)
-    
-    abnormal_labs = [lab for lab in patient_data.get('labs', []) if lab.get('flag') in ['H', 'L']]
+_clients = {}
+
+def get_client(api_key, base_url=None, asynchronous=False, timeout=60.0):
+    """Return a shared OpenAI client for this key/endpoint instead of one per call."""
+    key = (api_key, base_url, asynchronous, timeout)
+    if key not in _clients:
+        from openai import AsyncOpenAI, OpenAI
+        client_class = AsyncOpenAI if asynchronous else OpenAI
+        # Retries are handled here (see generate_insights_async), not by the SDK.
+        _clients[key] = client_class(api_key=api_key, base_url=base_url, timeout=timeout,
+                                     max_retries=0 if asynchronous else 2)
+    return _clients[key]
+
+def abnormal_labs_of(patient_data):
+    return compact_labs([lab for lab in patient_data.get('labs', []) if lab.get('flag') in ['H', 'L']])
+
+def build_insight_prompt(patient_data, token_budget=INSIGHT_PROMPT_TOKEN_BUDGET):
+    """Build the insight prompt, or return None if every lab is normal.
+
+    Labs are sent as compact JSON with only the fields the model needs;
+    trailing labs are dropped if the prompt would exceed `token_budget`.
+    """
+    abnormal_labs = abnormal_labs_of(patient_data)
     
     if not abnormal_labs:
-        return {"analysis": "All laboratory values are within normal range."}
+        return None
     
-    prompt = f"""Patient has these ABNORMAL lab values:
-{json.dumps(abnormal_labs, indent=2)}
+    prompt = _insight_prompt(abnormal_labs, patient_data)
+    while count_tokens(prompt) > token_budget and len(abnormal_labs) > 1:
+        abnormal_labs = abnormal_labs[:-1]
+        prompt = _insight_prompt(abnormal_labs, patient_data)
+    return prompt
+
+def _insight_prompt(abnormal_labs, patient_data):
+    return f"""Patient has these ABNORMAL lab values:
+{compact_json(abnormal_labs)}
 
 Diagnosis: {', '.join(patient_data.get('diagnosis', []))}
 
@@ -28,39 +63,438 @@ Provide BRIEF clinical insights (3-5 bullet points max):
 Be concise. Each bullet point should be 1 sentence only.
 Format as simple bullet points, not paragraphs."""
 
+NORMAL_INSIGHTS = {"analysis": "All laboratory values are within normal range."}
+
+def generate_diagnostic_insights(patient_data, api_key, base_url=None, cache=None, metrics=None):
+    """Generate diagnostic insights from structured patient data."""
+    
+    prompt = build_insight_prompt(patient_data)
+    if prompt is None:
+        return dict(NORMAL_INSIGHTS)
+    
+    if cache is not None:
+        cache_key = cache.key(patient_data)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+    
+    client = get_client(api_key, base_url)
+    started = time.perf_counter()
     response = client.chat.completions.create(
-        model="gpt-4o-mini",
+        model=MODEL_NAME,
         messages=[{"role": "user", "content": prompt}],
-        max_tokens=300
+        max_tokens=INSIGHT_MAX_TOKENS
+    )
+    if metrics is not None:
+        metrics.record("insight", MODEL_NAME, prompt, response, time.perf_counter() - started)
+    
+    insights = {"analysis": response.choices[0].message.content}
+    if cache is not None:
+        cache.put(cache_key, insights)
+    return insights
+
+class RateLimiter:
+    """Async limiter for requests and tokens per minute.
+
+    Both budgets refill continuously; `acquire` waits until one request
+    and `tokens` tokens are available.
+    """
+
+    def __init__(self, requests_per_minute=500, tokens_per_minute=200_000):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self.request_budget = float(requests_per_minute)
+        self.token_budget = float(tokens_per_minute)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated
+        self.updated = now
+        self.request_budget = min(self.rpm, self.request_budget + elapsed * self.rpm / 60)
+        self.token_budget = min(self.tpm, self.token_budget + elapsed * self.tpm / 60)
+
+    async def acquire(self, tokens):
+        tokens = min(tokens, self.tpm)
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.request_budget >= 1 and self.token_budget >= tokens:
+                    self.request_budget -= 1
+                    self.token_budget -= tokens
+                    return
+                wait_requests = (1 - self.request_budget) * 60 / self.rpm
+                wait_tokens = (tokens - self.token_budget) * 60 / self.tpm
+                await asyncio.sleep(max(wait_requests, wait_tokens, 0.01))
+
+def retryable_errors():
+    """OpenAI errors worth retrying; the SDK is only imported once a call fails."""
+    import openai
+    return (
+        openai.RateLimitError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.InternalServerError,
     )
+
+async def complete_with_retries(client, prompt, max_tokens, limiter, max_retries=5, base_delay=1.0,
+                                metrics=None, purpose="insight", model=MODEL_NAME):
+    """Send one chat completion with rate limiting and exponential backoff."""
+    for attempt in range(max_retries + 1):
+        await limiter.acquire(count_tokens(prompt) + max_tokens)
+        try:
+            started = time.perf_counter()
+            response = await client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=max_tokens
+            )
+            if metrics is not None:
+                metrics.record(purpose, model, prompt, response, time.perf_counter() - started)
+            return response.choices[0].message.content
+        except retryable_errors():
+            if attempt == max_retries:
+                raise
+            delay = base_delay * 2 ** attempt
+            await asyncio.sleep(delay + random.uniform(0, delay / 2))
+
+async def generate_insights_async(client, patient_data, limiter, max_retries=5, metrics=None):
+    """Async generate_diagnostic_insights with rate limiting and exponential backoff."""
+    prompt = build_insight_prompt(patient_data)
+    if prompt is None:
+        return dict(NORMAL_INSIGHTS)
+    
+    content = await complete_with_retries(client, prompt, INSIGHT_MAX_TOKENS, limiter, max_retries,
+                                          metrics=metrics)
+    return {"analysis": content}
+
+def build_batch_prompt(batch):
+    """Build one prompt for several patients; `batch` is [(item_id, patient_data)]."""
+    patients = [
+        {
+            "id": item_id,
+            "abnormal_labs": abnormal_labs_of(patient_data),
+            "diagnosis": patient_data.get('diagnosis', []),
+        }
+        for item_id, patient_data in batch
+    ]
+    return f"""Each patient below has ABNORMAL lab values and a diagnosis:
+{compact_json(patients)}
+
+For EACH patient provide BRIEF clinical insights (3-5 bullet points max):
+- What each abnormality might indicate
+- Overall pattern interpretation
+- How it relates to the diagnosis
+
+Be concise. Each bullet point should be 1 sentence only.
+Respond with ONLY a JSON array with one object per patient, like:
+[{{"id": "<patient id>", "insights": "- first point\n- second point"}}]"""
+
+def parse_batch_response(content, item_ids):
+    """Return {item_id: analysis text} for every well-formed item in a batch reply."""
+    start = content.find('[')
+    end = content.rfind(']')
+    if start == -1 or end < start:
+        return {}
+    try:
+        items = json.loads(content[start:end + 1])
+    except json.JSONDecodeError:
+        return {}
+    
+    parsed = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict) or item.get('id') not in item_ids:
+            continue
+        insights = item.get('insights')
+        if isinstance(insights, list):
+            insights = '\n'.join(f"- {point}" if not str(point).startswith('-') else str(point) for point in insights)
+        if isinstance(insights, str) and insights.strip():
+            parsed[item['id']] = insights.strip()
+    return parsed
+
+class InsightBatcher:
+    """Packs concurrent insight requests into multi-patient prompts.
+
+    Requests are collected until `batch_size` are waiting, the prompt
+    would exceed `token_budget`, or `max_wait` seconds pass, then sent
+    as one prompt. Patients missing from the reply, or in a batch that
+    failed outright, fall back to single-patient calls, run concurrently
+    within the shared semaphore and rate limiter.
+    """
+
+    def __init__(self, client, limiter, semaphore, batch_size=10, max_retries=5, max_wait=0.05,
+                 token_budget=INSIGHT_PROMPT_TOKEN_BUDGET * 4, metrics=None):
+        self.client = client
+        self.limiter = limiter
+        self.semaphore = semaphore
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.max_wait = max_wait
+        self.token_budget = token_budget
+        self.metrics = metrics
+        self.queue = []
+        self.queued_tokens = 0
+        self.timer = None
+        self.tasks = set()
+        self.batch_requests = 0
+        self.batched_patients = 0
+        self.fallback_patients = 0
+
+    async def submit(self, patient_data):
+        future = asyncio.get_running_loop().create_future()
+        tokens = count_tokens(compact_json(abnormal_labs_of(patient_data))) + 20
+        if self.queue and self.queued_tokens + tokens > self.token_budget:
+            self._flush()
+        self.queue.append((patient_data, future))
+        self.queued_tokens += tokens
+        if len(self.queue) >= self.batch_size:
+            self._flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.queue = self.queue, []
+        self.queued_tokens = 0
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _run(self, batch):
+        items = [(f"P{i + 1}", patient_data) for i, (patient_data, _) in enumerate(batch)]
+        parsed = {}
+        try:
+            async with self.semaphore:
+                self.batch_requests += 1
+                content = await complete_with_retries(
+                    self.client, build_batch_prompt(items), INSIGHT_MAX_TOKENS * len(items),
+                    self.limiter, self.max_retries, metrics=self.metrics, purpose="insight_batch"
+                )
+            parsed = parse_batch_response(content, {item_id for item_id, _ in items})
+        except Exception as e:
+            print(f"  Batch of {len(items)} failed ({e}); falling back to single requests")
+        
+        fallbacks = []
+        for (item_id, patient_data), (_, future) in zip(items, batch):
+            if item_id in parsed:
+                self.batched_patients += 1
+                future.set_result({"analysis": parsed[item_id]})
+            else:
+                fallbacks.append(self._fallback(patient_data, future))
+        await asyncio.gather(*fallbacks)
+
+    async def _fallback(self, patient_data, future):
+        self.fallback_patients += 1
+        try:
+            async with self.semaphore:
+                insights = await generate_insights_async(self.client, patient_data, self.limiter,
+                                                         max_retries=self.max_retries, metrics=self.metrics)
+            future.set_result(insights)
+        except Exception as e:
+            future.set_exception(e)
+
+    def report(self):
+        print(f"Batched insights: {self.batch_requests} batch requests covered {self.batched_patients} "
+              f"patients, {self.fallback_patients} fell back to single requests")
+
+def insight_fingerprint(patient_data):
+    """Hash of what the insight depends on: model settings and the prompt built from the labs."""
+    payload = json.dumps([INSIGHT_CACHE_NAMESPACE, build_insight_prompt(patient_data)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+def load_checkpoint(checkpoint_file):
+    """Read {patient_id: (fingerprint, insights)} from a JSON-lines checkpoint, if present.
+
+    Entries written before fingerprints were stored get None, so they
+    never match and those patients are analysed again.
+    """
+    done = {}
+    if checkpoint_file and os.path.exists(checkpoint_file):
+        with open(checkpoint_file, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A run killed mid-write can leave a partial last line.
+                    continue
+                done[entry['patient_id']] = (entry.get('fingerprint'), entry['ai_insights'])
+    return done
+
+async def add_insights_async(all_patients, api_key, base_url=None, concurrency=8,
+                             requests_per_minute=500, tokens_per_minute=200_000,
+                             max_retries=5, timeout=60.0, checkpoint_file=None, cache=None,
+                             batch_size=1, metrics=None):
+    """Add `ai_insights` to every patient using concurrent requests.
+
+    One client is shared by all requests, at most `concurrency` are in
+    flight, and each finished patient is appended to `checkpoint_file`
+    so an interrupted run resumes where it stopped. A checkpointed
+    patient is only restored if its insight_fingerprint is unchanged,
+    so re-extracted reports with different labs are analysed again. With an
+    InsightCache, patients whose profile was already answered (or is
+    being answered right now) reuse that response. With `batch_size`
+    above 1, patients are packed into multi-patient prompts (see
+    InsightBatcher). Calls are recorded in `metrics` (LLMMetrics) if
+    given. Returns the number of patients that still failed after
+    retries.
+    """
+    fingerprints = {pid: insight_fingerprint(patient_data) for pid, patient_data in all_patients.items()}
+    restored = set()
+    stale = 0
+    for patient_id, (fingerprint, insights) in load_checkpoint(checkpoint_file).items():
+        if patient_id not in all_patients:
+            continue
+        if fingerprint != fingerprints[patient_id]:
+            stale += 1
+            continue
+        all_patients[patient_id]['ai_insights'] = insights
+        restored.add(patient_id)
+    
+    pending = [pid for pid in all_patients if pid not in restored]
+    print(f"{len(restored)} patients restored from checkpoint ({stale} stale entries ignored), "
+          f"{len(pending)} to analyze")
+    
+    client = get_client(api_key, base_url, asynchronous=True, timeout=timeout)
+    limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    semaphore = asyncio.Semaphore(concurrency)
+    checkpoint = open(checkpoint_file, 'a') if checkpoint_file else None
+    failures = 0
+    in_flight = {}
+    batcher = None
+    if batch_size > 1:
+        batcher = InsightBatcher(client, limiter, semaphore, batch_size=batch_size,
+                                 max_retries=max_retries, metrics=metrics)
+    
+    async def request(patient_data):
+        if batcher is not None and build_insight_prompt(patient_data) is not None:
+            return await batcher.submit(patient_data)
+        async with semaphore:
+            return await generate_insights_async(client, patient_data, limiter, max_retries=max_retries,
+                                                 metrics=metrics)
     
-    return {"analysis": response.choices[0].message.content}
+    async def fetch(patient_data):
+        if cache is None or build_insight_prompt(patient_data) is None:
+            return await request(patient_data)
+        
+        cache_key = cache.key(patient_data)
+        if cache_key in in_flight:
+            cache.hits += 1
+            return await asyncio.shield(in_flight[cache_key])
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        async def call():
+            insights = await request(patient_data)
+            cache.put(cache_key, insights)
+            return insights
+        
+        in_flight[cache_key] = asyncio.ensure_future(call())
+        try:
+            return await in_flight[cache_key]
+        finally:
+            in_flight.pop(cache_key, None)
+    
+    async def analyze(patient_id):
+        nonlocal failures
+        try:
+            insights = await fetch(all_patients[patient_id])
+        except Exception as e:
+            failures += 1
+            all_patients[patient_id]['ai_insights'] = {"error": f"Insight generation failed: {e}"}
+            print(f"  {patient_id}: failed ({e})")
+            return
+        all_patients[patient_id]['ai_insights'] = insights
+        if checkpoint:
+            checkpoint.write(json.dumps({"patient_id": patient_id, "fingerprint": fingerprints[patient_id],
+                                         "ai_insights": insights}) + "\n")
+            checkpoint.flush()
+    
+    try:
+        await asyncio.gather(*(analyze(pid) for pid in pending))
+    finally:
+        if checkpoint:
+            checkpoint.close()
+    if batcher is not None:
+        batcher.report()
+    return failures
+
 def add_insights_to_extracted_data():
     """Add LLM insights to existing extracted data."""
     
+    parser = argparse.ArgumentParser(description="Add LLM insights to extracted patient data.")
+    parser.add_argument("--input", default="output/extracted_patient_info.json")
+    parser.add_argument("--output", default="output/extracted_patients_with_ai.json")
+    parser.add_argument("--checkpoint", default="output/insights_checkpoint.jsonl")
+    parser.add_argument("--base-url", default=os.getenv("OPENAI_BASE_URL"),
+                        help="Chat-completions endpoint, e.g. a local stub server")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rpm", type=int, default=500, help="Requests per minute")
+    parser.add_argument("--tpm", type=int, default=200_000, help="Tokens per minute")
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="Patients packed into one prompt (1 sends one request per patient)")
+    parser.add_argument("--metrics-file", default="output/llm_metrics.jsonl",
+                        help="JSON-lines log of tokens, latency and cost per call")
+    parser.add_argument("--no-cache", action="store_true", help="Always call the API")
+    parser.add_argument("--cache-file", default="output/insight_cache.json")
+    parser.add_argument("--value-digits", type=int, default=None,
+                        help="Bucket lab values to this many significant digits when matching cached insights")
+    parser.add_argument("--cache-ttl-days", type=float, default=30)
+    parser.add_argument("--cache-max-entries", type=int, default=50_000)
+    args = parser.parse_args()
+    
     api_key = os.getenv("OPENAI_API_KEY")
     
     if not api_key:
         print("Error: OPENAI_API_KEY not found in .env")
         return
     
-    input_file = "output/extracted_patient_info.json"   # Read from original
-    output_file = "output/extracted_patients_with_ai.json"  # Save to new file
-    
-    with open(input_file, 'r') as f:
+    with open(args.input, 'r') as f:
         all_patients = json.load(f)
     
+    cache = None
+    if not args.no_cache:
+        cache = InsightCache(args.cache_file, significant_digits=args.value_digits,
+                             ttl_seconds=args.cache_ttl_days * 24 * 3600,
+                             max_entries=args.cache_max_entries, namespace=INSIGHT_CACHE_NAMESPACE)
+    
+    metrics = LLMMetrics(args.metrics_file)
+    
     print(f"Generating insights for {len(all_patients)} patients...\n")
     
-    for patient_id, patient_data in all_patients.items():
-        print(f"Analyzing {patient_id}...")
-        insights = generate_diagnostic_insights(patient_data, api_key)
-        patient_data['ai_insights'] = insights
+    start = time.perf_counter()
+    try:
+        failures = asyncio.run(add_insights_async(
+            all_patients, api_key, base_url=args.base_url, concurrency=args.concurrency,
+            requests_per_minute=args.rpm, tokens_per_minute=args.tpm,
+            max_retries=args.max_retries, timeout=args.timeout, checkpoint_file=args.checkpoint,
+            cache=cache, batch_size=args.batch_size, metrics=metrics
+        ))
+    finally:
+        if cache is not None:
+            cache.save()
     
-    with open(output_file, 'w') as f:
+    with open(args.output, 'w') as f:
         json.dump(all_patients, f, indent=4)
     
-    print(f"\nInsights added and saved to {output_file}")
+    print(f"\nInsights added and saved to {args.output} in {time.perf_counter() - start:.1f}s")
+    if failures:
+        print(f"{failures} patients failed; rerun to retry them from the checkpoint")
+    if cache is not None:
+        cache.report()
+    metrics.report()
 
 if __name__ == "__main__":
-    add_insights_to_extracted_data()
\ No newline at end of file
+    from dotenv import load_dotenv
+    load_dotenv()
+    add_insights_to_extracted_data()
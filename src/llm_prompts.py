@@ -0,0 +1,99 @@
+import json
+import os
+import time
+from collections import defaultdict
+
+# USD per million (input, output) tokens.
+MODEL_PRICING = {
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+INSIGHT_LAB_FIELDS = ('test', 'value', 'unit', 'flag')
+TRUNCATION_MARKER = "[... truncated to fit token budget]"
+
+def compact_json(obj):
+    """Serialise without indentation or spaces after separators."""
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+
+def compact_labs(labs, fields=INSIGHT_LAB_FIELDS):
+    """Keep only the lab fields the model needs."""
+    return [{field: lab[field] for field in fields if field in lab} for lab in labs]
+
+_encoding = None
+
+def count_tokens(text):
+    """Count tokens with tiktoken if installed, else estimate ~4 characters per token."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except ImportError:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    return len(text) // 4 + 1
+
+def truncate_to_budget(text, max_tokens):
+    """Drop trailing lines until `text` fits in `max_tokens`."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    lines = text.split('\n')
+    while lines and count_tokens('\n'.join(lines + [TRUNCATION_MARKER])) > max_tokens:
+        lines.pop()
+    return '\n'.join(lines + [TRUNCATION_MARKER])
+
+def compact_report(text):
+    """Strip trailing spaces and blank lines from a report before sending it."""
+    return '\n'.join(line.rstrip() for line in text.split('\n') if line.strip())
+
+class LLMMetrics:
+    """Per-call token, latency and cost accounting for LLM requests.
+
+    Every call is appended as one JSON line to `metrics_file`; `summary`
+    aggregates the calls made in this run by purpose.
+    """
+
+    def __init__(self, metrics_file="output/llm_metrics.jsonl"):
+        self.metrics_file = metrics_file
+        self.calls = []
+
+    def record(self, purpose, model, prompt, response, latency):
+        usage = getattr(response, "usage", None)
+        content = response.choices[0].message.content or ""
+        input_tokens = getattr(usage, "prompt_tokens", None) or count_tokens(prompt)
+        output_tokens = getattr(usage, "completion_tokens", None) or count_tokens(content)
+        input_price, output_price = MODEL_PRICING.get(model, (0.0, 0.0))
+        call = {
+            "timestamp": time.time(),
+            "purpose": purpose,
+            "model": model,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "latency_s": round(latency, 4),
+            "cost_usd": (input_tokens * input_price + output_tokens * output_price) / 1_000_000,
+        }
+        self.calls.append(call)
+        if self.metrics_file:
+            os.makedirs(os.path.dirname(self.metrics_file) or ".", exist_ok=True)
+            with open(self.metrics_file, 'a') as f:
+                f.write(json.dumps(call) + "\n")
+        return call
+
+    def summary(self):
+        by_purpose = defaultdict(lambda: {"calls": 0, "input_tokens": 0, "output_tokens": 0,
+                                          "latency_s": 0.0, "cost_usd": 0.0})
+        for call in self.calls:
+            totals = by_purpose[call["purpose"]]
+            totals["calls"] += 1
+            for key in ("input_tokens", "output_tokens", "latency_s", "cost_usd"):
+                totals[key] += call[key]
+        for totals in by_purpose.values():
+            totals["avg_latency_s"] = totals["latency_s"] / totals["calls"]
+        return dict(by_purpose)
+
+    def report(self):
+        for purpose, totals in self.summary().items():
+            print(f"LLM {purpose}: {totals['calls']} calls, {totals['input_tokens']} in / "
+                  f"{totals['output_tokens']} out tokens, {totals['avg_latency_s']:.2f}s avg latency, "
+                  f"${totals['cost_usd']:.4f}")
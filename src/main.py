@@ -1,49 +1,100 @@
-# import json
-# import os
-# import spacy
-# from preprocessing import read_reports_from_folder
-# from extraction import extract_all
+import argparse
+import json
+import os
+from preprocessing import iter_reports
+from pipeline import extract_reports_parallel
+from extraction_cache import ExtractionCache, extraction_options
+from instrumentation import ExtractionInstrumentation
+from model_loader import MODEL_CACHE_DIR
 
-# def main():
-#     folder_path = "data/Train"
-#     output_folder = "output"
-    
-#     os.makedirs(output_folder, exist_ok=True)
+def main():
+    parser = argparse.ArgumentParser(description="Extract structured data from medical reports.")
+    parser.add_argument("--folder", default="data/Train")
+    parser.add_argument("--output-folder", default="output")
+    parser.add_argument("--model", default="medical_ner_model_v2")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Number of worker processes (1 runs in-process)")
+    parser.add_argument("--chunk-size", type=int, default=64,
+                        help="Reports per worker shard")
+    parser.add_argument("--batch-size", type=int, default=256,
+                        help="Lines per nlp.pipe batch")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--pattern", default="*.txt", help="Glob for report file names")
+    parser.add_argument("--recursive", action="store_true", help="Also read subfolders")
+    parser.add_argument("--memo-size", type=int, default=100_000,
+                        help="Distinct lines memoized per worker (0 disables)")
+    parser.add_argument("--rules", action="store_true",
+                        help="Label templated lab lines with rules, NER only as fallback")
+    parser.add_argument("--prefilter", default=None,
+                        help="Comma-separated line checks before NER, e.g. digit,gazetteer")
+    parser.add_argument("--prefilter-parity", action="store_true",
+                        help="Also run NER on filtered lines and count labs the filter dropped")
+    parser.add_argument("--no-cache", action="store_true", help="Re-extract every report")
+    parser.add_argument("--cache-dir", default="cache/extraction")
+    parser.add_argument("--cache-max-mb", type=float, default=512)
+    parser.add_argument("--model-cache", action="store_true",
+                        help=f"Warm-start workers from a serialized copy of the model in {MODEL_CACHE_DIR}")
+    parser.add_argument("--instrument", default=None, metavar="PATH",
+                        help="Collect hot-path counters and latency histograms and write them to PATH")
+    parser.add_argument("--instrument-format", choices=("json", "prometheus"), default="json")
+    args = parser.parse_args()
+    prefilter_checks = tuple(args.prefilter.split(",")) if args.prefilter else None
     
-#     print("Loading NER model...")
-#     nlp = spacy.load("medical_ner_model")
+    os.makedirs(args.output_folder, exist_ok=True)
     
-#     print(f"Loading reports from {folder_path}...")
-#     reports = read_reports_from_folder(folder_path, limit=5)
-#     print(f"✓ Loaded {len(reports)} reports\n")
+    print(f"Streaming reports from {args.folder}...")
+    reports = iter_reports(args.folder, limit=args.limit, pattern=args.pattern,
+                           recursive=args.recursive)
     
-#     all_patients = {}
+    cache = None
+    if not args.no_cache:
+        cache = ExtractionCache(args.model, cache_dir=args.cache_dir,
+                                max_bytes=int(args.cache_max_mb * 1024 * 1024),
+                                options=extraction_options(args.rules, prefilter_checks))
     
-#     for filename, text in reports.items():
-#         print(f"Processing: {filename}")
-        
-#         complete_data = extract_all(text, nlp)
-#         patient_id = complete_data['patient'].get('id', filename)
-#         all_patients[patient_id] = complete_data
+    print(f"Extracting with {args.workers} worker(s)...")
+    all_patients = {}
+    worker_stats = {}
+    results = extract_reports_parallel(
+        reports, args.model, workers=args.workers,
+        chunk_size=args.chunk_size, batch_size=args.batch_size, cache=cache,
+        memo_size=args.memo_size, use_rules=args.rules, prefilter_checks=prefilter_checks,
+        prefilter_parity=args.prefilter_parity, worker_stats=worker_stats,
+        instrument=args.instrument is not None,
+        model_cache_dir=MODEL_CACHE_DIR if args.model_cache else None
+    )
+    for filename, complete_data in results:
+        patient_id = complete_data['patient'].get('id', filename)
+        all_patients[patient_id] = complete_data
     
-#     output_file = os.path.join(output_folder, "extracted_patient_info.json")
-#     with open(output_file, "w") as f:
-#         json.dump(all_patients, f, indent=4)
+    output_file = os.path.join(args.output_folder, "extracted_patient_info.json")
+    with open(output_file, "w") as f:
+        json.dump(all_patients, f, indent=4)
     
-#     print(f"\nSaved complete data to: {output_file}")
-#     print(f"Total patients processed: {len(all_patients)}")
-
-# if __name__ == "__main__":
-#     main()
-
-import json
-
-with open("output/extracted_patients_with_ai.json", "r") as f:
-    data = json.load(f)
-
-# Get first patient
-first_patient = list(data.values())[0]
+    print(f"\nSaved complete data to: {output_file}")
+    print(f"Total patients processed: {len(all_patients)}")
+    if "memo" in worker_stats:
+        memo = worker_stats["memo"]
+        print(f"Line memo: {memo['hits']} hits, {memo['misses']} misses "
+              f"({memo['hit_rate']:.1%} hit rate) across {worker_stats['workers']} worker(s)")
+    if "rules" in worker_stats:
+        rules = worker_stats["rules"]
+        print(f"Lab rules: {rules['rule_lines']} lines by template, "
+              f"{rules['ner_fallback_lines']} sent on to NER ({rules['rule_share']:.1%} by template)")
+    if "prefilter" in worker_stats:
+        prefilter = worker_stats["prefilter"]
+        print(f"Prefilter: {prefilter['filtered_lines']} lines skipped, {prefilter['passed_lines']} passed "
+              f"({prefilter['filtered_share']:.1%} skipped)")
+        if "parity_checked" in prefilter:
+            print(f"Prefilter parity: {prefilter['parity_misses']} of {prefilter['parity_checked']} "
+                  f"skipped lines would have produced a lab")
+    if "instrumentation" in worker_stats:
+        instrumentation = ExtractionInstrumentation.from_stats(worker_stats["instrumentation"])
+        instrumentation.save(args.instrument, args.instrument_format)
+        instrumentation.report()
+        print(f"Instrumentation written to {args.instrument}")
+    if cache is not None:
+        cache.report()
 
-# Show AI insights structure
-print("AI Insights keys:")
-print(first_patient.get('ai_insights', {}).keys())
\ No newline at end of file
+if __name__ == "__main__":
+    main()
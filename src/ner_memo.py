@@ -0,0 +1,51 @@
+from collections import OrderedDict
+
+def doc_spans(doc):
+    """Reduce a spaCy doc to a tuple of (start_char, end_char, label) spans."""
+    return tuple((ent.start_char, ent.end_char, ent.label_) for ent in doc.ents)
+
+class LineEntityMemo:
+    """Bounded LRU cache of NER entity spans keyed by stripped line text.
+
+    Reports repeat the same boilerplate lines (noise sentences, section
+    headers), so most of them only need to go through the model once.
+    """
+
+    def __init__(self, maxsize=100_000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, line):
+        spans = self.entries.get(line)
+        if spans is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(line)
+        self.hits += 1
+        return spans
+
+    def put(self, line, spans):
+        self.entries[line] = spans
+        self.entries.move_to_end(line)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def spans(self, line, nlp_model):
+        """Return cached spans for `line`, running the model on a miss."""
+        spans = self.get(line)
+        if spans is None:
+            spans = doc_spans(nlp_model(line))
+            self.put(line, spans)
+        return spans
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0,
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+        }
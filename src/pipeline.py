@@ -0,0 +1,165 @@
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from extraction import extract_all_batch
+from instrumentation import ExtractionInstrumentation
+from lab_rules import LabLineRules
+from line_prefilter import LinePrefilter
+from model_loader import load_ner_model
+from ner_memo import LineEntityMemo
+
+_nlp = None
+_memo = None
+_rules = None
+_prefilter = None
+_instrumentation = None
+_init_args = None
+
+def _init_worker(model_path, memo_size=0, use_rules=False, prefilter_checks=None, prefilter_parity=False,
+                 instrument=False, model_cache_dir=None):
+    """Load the spaCy model and per-line stages once per worker process."""
+    global _nlp, _memo, _rules, _prefilter, _instrumentation, _init_args
+    _init_args = (model_path, memo_size, use_rules, prefilter_checks, prefilter_parity, instrument,
+                  model_cache_dir)
+    _nlp = load_ner_model(model_path, cache_dir=model_cache_dir)
+    _memo = LineEntityMemo(memo_size) if memo_size else None
+    _rules = LabLineRules() if use_rules else None
+    _prefilter = LinePrefilter(prefilter_checks, parity=prefilter_parity) if prefilter_checks else None
+    _instrumentation = ExtractionInstrumentation() if instrument else None
+
+def _extract_chunk(chunk, batch_size=256):
+    """Run batched extraction over one shard of (filename, text) pairs.
+
+    Returns the results plus (pid, counters) so the parent can
+    aggregate stage counters across workers.
+    """
+    filenames = [filename for filename, _ in chunk]
+    texts = [text for _, text in chunk]
+    extracted = extract_all_batch(texts, _nlp, batch_size=batch_size, memo=_memo,
+                                  rules=_rules, prefilter=_prefilter, instrumentation=_instrumentation)
+    counters = {}
+    if _memo is not None:
+        counters["memo"] = _memo.stats()
+    if _rules is not None:
+        counters["rules"] = _rules.stats()
+    if _prefilter is not None:
+        counters["prefilter"] = _prefilter.stats()
+    if _instrumentation is not None:
+        counters["instrumentation"] = _instrumentation.stats()
+    return list(zip(filenames, extracted)), (os.getpid(), counters)
+
+def _chunks(items, size):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _completed(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+def _split_cached(chunk, cache):
+    """Return ({index: cached result}, uncached items) for one shard."""
+    if cache is None:
+        return {}, chunk
+    cached = {}
+    todo = []
+    for i, (filename, text) in enumerate(chunk):
+        extracted = cache.get(text)
+        if extracted is None:
+            todo.append((filename, text))
+        else:
+            cached[i] = extracted
+    return cached, todo
+
+def _sum_worker_stats(counters_by_pid):
+    """Sum each worker's latest stage counters into one dict."""
+    totals = {"workers": len(counters_by_pid)}
+    for counters in counters_by_pid.values():
+        for component, stats in counters.items():
+            summed = totals.setdefault(component, {})
+            for key, value in stats.items():
+                summed[key] = summed.get(key, 0) + value
+    
+    if "memo" in totals:
+        memo = totals["memo"]
+        lookups = memo["hits"] + memo["misses"]
+        memo["hit_rate"] = memo["hits"] / lookups if lookups else 0
+    if "rules" in totals:
+        rules = totals["rules"]
+        lines = rules["rule_lines"] + rules["ner_fallback_lines"]
+        rules["rule_share"] = rules["rule_lines"] / lines if lines else 0
+    if "prefilter" in totals:
+        prefilter = totals["prefilter"]
+        lines = prefilter["passed_lines"] + prefilter["filtered_lines"]
+        prefilter["filtered_share"] = prefilter["filtered_lines"] / lines if lines else 0
+    return totals
+
+def _merge(chunk, cached, outcome, cache, worker_stats):
+    """Yield a shard's results in input order, caching the fresh ones."""
+    fresh, (pid, counters) = outcome
+    if worker_stats is not None and pid is not None:
+        by_pid = worker_stats.setdefault("by_pid", {})
+        by_pid[pid] = counters
+        worker_stats.update(_sum_worker_stats(by_pid))
+    fresh = iter(fresh)
+    for i, (filename, text) in enumerate(chunk):
+        if i in cached:
+            yield filename, cached[i]
+        else:
+            _, extracted = next(fresh)
+            if cache is not None:
+                cache.put(text, extracted)
+            yield filename, extracted
+
+def extract_reports_parallel(reports, model_path, workers=None, chunk_size=64, batch_size=256,
+                             cache=None, memo_size=100_000, use_rules=False,
+                             prefilter_checks=None, prefilter_parity=False, worker_stats=None,
+                             instrument=False, model_cache_dir=None):
+    """Extract reports across worker processes.
+
+    `reports` is an iterable of (filename, text) pairs. Yields
+    (filename, extracted) pairs in input order. At most a few shards
+    per worker are in flight, so memory stays bounded for large inputs.
+    With an ExtractionCache, cached reports are served from disk and
+    only new or changed ones reach the workers. Each worker keeps a
+    LineEntityMemo of `memo_size` lines (0 disables it) and, with
+    `use_rules`, labels templated lab lines without the model.
+    `prefilter_checks` (see LinePrefilter) skips lines that cannot hold
+    a lab result. With `instrument`, workers collect
+    ExtractionInstrumentation counters and latency histograms. Pass a
+    dict as `worker_stats` to have it filled with the summed counters.
+    Workers load the model through load_ner_model, warm-starting from
+    `model_cache_dir` if given; a fully cached run never loads it.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = _chunks(reports, chunk_size)
+    init_args = (model_path, memo_size, use_rules, prefilter_checks, prefilter_parity, instrument,
+                 model_cache_dir)
+    
+    if workers == 1:
+        # In-process state is reused across calls only while the settings match.
+        for chunk in chunks:
+            cached, todo = _split_cached(chunk, cache)
+            if todo and _init_args != init_args:
+                _init_worker(*init_args)
+            outcome = _extract_chunk(todo, batch_size) if todo else ([], (None, None))
+            yield from _merge(chunk, cached, outcome, cache, worker_stats)
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args) as pool:
+        pending = deque()
+        for chunk in chunks:
+            cached, todo = _split_cached(chunk, cache)
+            future = pool.submit(_extract_chunk, todo, batch_size) if todo else _completed(([], (None, None)))
+            pending.append((chunk, cached, future))
+            if len(pending) >= workers * 2:
+                chunk, cached, future = pending.popleft()
+                yield from _merge(chunk, cached, future.result(), cache, worker_stats)
+        while pending:
+            chunk, cached, future = pending.popleft()
+            yield from _merge(chunk, cached, future.result(), cache, worker_stats)
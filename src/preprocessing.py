@@ -1,23 +1,53 @@
 import os
+from fnmatch import fnmatch
 
-def read_reports_from_folder(folder_path, limit=None):
+def iter_reports(folder_path, limit=None, pattern="*.txt", recursive=False):
+    """Lazily yield (filename, text) pairs for reports in a folder.
+
+    Entries are visited in sorted order. `pattern` is a glob matched
+    against the file name, and `limit` counts reports actually yielded.
+    With `recursive=True`, subfolders are walked and filenames are
+    returned relative to `folder_path`. Symlinks to folders are not
+    followed (as with os.walk), so a link back up the tree can't loop.
+    """
     if not os.path.exists(folder_path):
         raise FileNotFoundError(f"The folder {folder_path} does not exist.")
     
-    mapp = {}
-    for i, filename in enumerate(os.listdir(folder_path)):
-        if limit is not None and i >= limit:
-            break
-        if filename.endswith(".txt"):
+    count = 0
+    stack = [folder_path]
+    while stack:
+        current = stack.pop()
+        with os.scandir(current) as it:
+            entries = sorted(it, key=lambda e: e.name)
+        
+        subfolders = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if recursive:
+                    subfolders.append(entry.path)
+                continue
+            if not entry.is_file() or not fnmatch(entry.name, pattern):
+                continue
+            
+            filename = os.path.relpath(entry.path, folder_path)
             try:
-                with open(os.path.join(folder_path, filename), "r", encoding="utf-8") as f:
+                with open(entry.path, "r", encoding="utf-8") as f:
                     report_text = f.read()
-                    mapp[filename] = report_text
             except Exception as e:
                 print(f"Could not read {filename}: {e}")
                 continue
-    return mapp
+            
+            yield filename, report_text
+            count += 1
+            if limit is not None and count >= limit:
+                return
+        
+        stack.extend(reversed(subfolders))
 
+def read_reports_from_folder(folder_path, limit=None, pattern="*.txt", recursive=False):
+    """Read reports into a {filename: text} dict (see iter_reports)."""
+    return dict(iter_reports(folder_path, limit=limit, pattern=pattern, recursive=recursive))
 
-mapp = read_reports_from_folder("data/Train", limit=2)
-print(mapp.keys())
\ No newline at end of file
+if __name__ == "__main__":
+    mapp = read_reports_from_folder("data/Train", limit=2)
+    print(mapp.keys())
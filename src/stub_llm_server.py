@@ -0,0 +1,113 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class StubChatHandler(BaseHTTPRequestHandler):
+    """Minimal stand-in for the OpenAI chat-completions endpoint.
+
+    Replies with a canned completion after `latency` seconds and fails
+    with 429/500 at `failure_rate`, so the insight runner's concurrency,
+    rate limiting and retries can be exercised offline. Multi-patient
+    prompts get a JSON array reply, with each item dropped at
+    `drop_rate` to exercise the single-patient fallback.
+    """
+
+    latency = 0.2
+    failure_rate = 0.0
+    drop_rate = 0.0
+    reply = "- Stub insight for local testing."
+    requests_served = 0
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/health"):
+            self._send_json(200, {"status": "ok", "requests_served": StubChatHandler.requests_served})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        
+        time.sleep(self.latency)
+        with StubChatHandler.lock:
+            StubChatHandler.requests_served += 1
+        if random.random() < self.failure_rate:
+            status = random.choice([429, 500])
+            self._send_json(status, {"error": {"message": "stub failure", "type": "stub", "code": status}})
+            return
+        
+        prompt = " ".join(m.get("content", "") for m in request.get("messages", []))
+        reply = self.reply
+        if "Respond with ONLY a JSON array" in prompt:
+            ids = re.findall(r'"id":\s*"(P\d+)"', prompt)
+            reply = json.dumps([
+                {"id": item_id, "insights": self.reply}
+                for item_id in ids if random.random() >= self.drop_rate
+            ])
+        prompt_tokens = len(prompt) // 4 + 1
+        completion_tokens = len(reply) // 4 + 1
+        self._send_json(200, {
+            "id": f"chatcmpl-stub-{StubChatHandler.requests_served}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+def start_stub_server(host="127.0.0.1", port=0, latency=0.2, failure_rate=0.0, reply=None, drop_rate=0.0):
+    """Start the stub in a background thread; returns (server, base_url)."""
+    handler = type("ConfiguredStubChatHandler", (StubChatHandler,), {
+        "latency": latency,
+        "failure_rate": failure_rate,
+        "drop_rate": drop_rate,
+        "reply": reply or StubChatHandler.reply,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stub of the chat-completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8808)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0,
+                        help="Chance of leaving a patient out of a batch reply")
+    args = parser.parse_args()
+    
+    server, base_url = start_stub_server(args.host, args.port, args.latency, args.failure_rate,
+                                         drop_rate=args.drop_rate)
+    print(f"Stub chat-completions server at {base_url} (set OPENAI_BASE_URL or --base-url)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
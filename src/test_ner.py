@@ -1,8 +1,8 @@
-import spacy
 from extraction import extract_lab_results_ner, extract_diagnosis, extract_medications
+from model_loader import load_ner_model
 import json
 
-nlp = spacy.load("medical_ner_model")
+nlp = load_ner_model("medical_ner_model")
 
 sample = """Haemoglobin (g/dL) came out to be 8.63 g/dL, compared to normal 12.0-16.0. Marked as L.
 WBC (/uL) was measured at 11458.19 /uL, compared to normal 4000-10000. Marked as H.
@@ -0,0 +1,270 @@
+import argparse
+import copy
+import json
+import os
+import time
+from augment_training_data import DEFAULT_AUGMENTATIONS
+from evaluate import evaluate_labs, load_ground_truth
+from extraction import extract_lab_results_ner_batch, report_sections
+from preprocessing import iter_reports
+from training_corpus import AugmentingCorpus, DocBinCorpus
+
+# CPU speed/accuracy tiers for the NER model's HashEmbedCNN tok2vec and parser
+# hidden layer. "accurate" is spaCy's default, which medical_ner_model_v2 uses.
+MODEL_TIERS = {
+    "accurate": {"width": 96, "depth": 4, "embed_size": 2000, "window_size": 1, "hidden_width": 64},
+    "balanced": {"width": 64, "depth": 2, "embed_size": 1000, "window_size": 1, "hidden_width": 64},
+    "fast": {"width": 32, "depth": 1, "embed_size": 500, "window_size": 1, "hidden_width": 32},
+}
+
+DEFAULT_CONFIG = {
+    "corpus": {
+        "type": "augmenting",
+        "folder": "data/Train",
+        "limit": 70,
+        "augmentations": DEFAULT_AUGMENTATIONS,
+        "variants_per_report": None
+    },
+    "model": {
+        "lang": "en",
+        "tier": "accurate"
+    },
+    "training": {
+        "max_epochs": 20,
+        "dropout": 0.5,
+        "batch_size": {"start": 4, "stop": 32, "compound": 1.001},
+        "seed": 0,
+        "eval_frequency": 1,
+        "patience": 5
+    },
+    "evaluation": {
+        "test_folder": "data/Test",
+        "batch_size": 256
+    },
+    "output": {
+        "model": "medical_ner_model_v2",
+        "last_model": None,
+        "log": "output/training_log.json"
+    }
+}
+
+def _merge(defaults, overrides):
+    merged = dict(defaults)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+def load_training_config(path=None):
+    """Read a JSON training config; sections and keys it leaves out come from DEFAULT_CONFIG."""
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    if path is None:
+        return config
+    with open(path, "r") as f:
+        return _merge(config, json.load(f))
+
+def build_corpus(corpus_config, seed=0):
+    """A DocBinCorpus ("docbin") or AugmentingCorpus ("augmenting") from the corpus section."""
+    if corpus_config["type"] == "docbin":
+        return DocBinCorpus(corpus_config["path"], in_memory=corpus_config.get("in_memory", True))
+    if corpus_config["type"] == "augmenting":
+        reports = iter_reports(corpus_config["folder"], limit=corpus_config.get("limit"))
+        return AugmentingCorpus((text for _, text in reports), corpus_config["augmentations"],
+                                variants_per_report=corpus_config.get("variants_per_report"), seed=seed)
+    raise ValueError(f"Unknown corpus type: {corpus_config['type']!r}")
+
+def ner_architecture(model_config):
+    """NER model config for the section's tier.
+
+    width, depth, embed_size, window_size and hidden_width given in the
+    model section override the tier's values.
+    """
+    sizes = dict(MODEL_TIERS[model_config.get("tier", "accurate")])
+    sizes.update({key: model_config[key] for key in sizes if key in model_config})
+    return {
+        "@architectures": "spacy.TransitionBasedParser.v2",
+        "state_type": "ner",
+        "extra_state_tokens": False,
+        "hidden_width": sizes["hidden_width"],
+        "maxout_pieces": 2,
+        "use_upper": True,
+        "nO": None,
+        "tok2vec": {
+            "@architectures": "spacy.HashEmbedCNN.v2",
+            "pretrained_vectors": None,
+            "width": sizes["width"],
+            "depth": sizes["depth"],
+            "embed_size": sizes["embed_size"],
+            "window_size": sizes["window_size"],
+            "maxout_pieces": 3,
+            "subword_features": True
+        }
+    }
+
+def build_pipeline(model_config):
+    """Blank pipeline with an NER component sized by the model section (see MODEL_TIERS)."""
+    import spacy
+    nlp = spacy.blank(model_config["lang"])
+    nlp.add_pipe("ner", config={"model": ner_architecture(model_config)})
+    return nlp
+
+def batch_sizes(batch_config):
+    """An int for fixed-size batches, or {"start", "stop", "compound"} for compounding sizes."""
+    if isinstance(batch_config, int):
+        return batch_config
+    from spacy.util import compounding
+    return compounding(batch_config["start"], batch_config["stop"], batch_config["compound"])
+
+class DevSet:
+    """Test reports with their ground-truth labs, scored the way evaluate.py scores them.
+
+    Lab sections are segmented once up front; each evaluation only runs
+    the model under training over them and returns the average lab F1
+    (evaluate.evaluate_labs) across reports.
+    """
+
+    def __init__(self, test_folder="data/Test", batch_size=256):
+        self.filenames = []
+        self.lab_sections = []
+        self.ground_truth = []
+        self.batch_size = batch_size
+        for filename, text in iter_reports(test_folder):
+            self.filenames.append(filename)
+            self.lab_sections.append(report_sections(text)["labs"])
+            self.ground_truth.append(load_ground_truth(filename)["labs"])
+
+    def score(self, nlp):
+        predicted = extract_lab_results_ner_batch(self.lab_sections, nlp, batch_size=self.batch_size)
+        metrics = [evaluate_labs(labs, gt_labs) for labs, gt_labs in zip(predicted, self.ground_truth)]
+        count = len(metrics) or 1
+        return {
+            "precision": sum(m[0] for m in metrics) / count,
+            "recall": sum(m[1] for m in metrics) / count,
+            "f1": sum(m[2] for m in metrics) / count,
+        }
+
+def train_from_config(config):
+    """Train an NER model as described by `config`; returns the training log.
+
+    Every `eval_frequency` epochs the model is scored on the dev set and
+    saved to output.model when its F1 improves, so that directory always
+    holds the best checkpoint. Training stops after `patience`
+    evaluations without improvement (0 disables early stopping). With no
+    evaluation section, or when the test folder or its ground-truth JSONs
+    are missing, the model after the last epoch is saved instead.
+    """
+    from spacy.util import fix_random_seed, minibatch
+
+    training = config["training"]
+    output = config["output"]
+    seed = training["seed"]
+    fix_random_seed(seed)
+
+    print("Loading training data...")
+    corpus = build_corpus(config["corpus"], seed)
+    dev_set = None
+    if config.get("evaluation"):
+        try:
+            dev_set = DevSet(config["evaluation"]["test_folder"], config["evaluation"].get("batch_size", 256))
+            print(f"Dev set: {len(dev_set.filenames)} reports from {config['evaluation']['test_folder']}")
+        except FileNotFoundError as e:
+            print(f"Warning: no dev set ({e}); skipping dev scoring and early stopping, "
+                  f"the final model will be saved")
+
+    nlp = build_pipeline(config["model"])
+    ner = nlp.get_pipe("ner")
+    for label in corpus.labels(nlp.vocab):
+        ner.add_label(label)
+    optimizer = nlp.begin_training()
+    sizes = batch_sizes(training["batch_size"])
+
+    log = {"config": config, "epochs": [], "best": None}
+    best_f1 = None
+    evals_without_improvement = 0
+    run_started = time.perf_counter()
+
+    for epoch in range(1, training["max_epochs"] + 1):
+        losses = {}
+        words = 0
+        started = time.perf_counter()
+        for examples in minibatch(corpus.examples(nlp, shuffle=True, seed=f"{seed}:{epoch}"), size=sizes):
+            words += sum(len(example.reference) for example in examples)
+            nlp.update(examples, drop=training["dropout"], sgd=optimizer, losses=losses)
+        train_seconds = time.perf_counter() - started
+
+        entry = {
+            "epoch": epoch,
+            "loss": round(float(losses.get("ner", 0.0)), 4),
+            "words": words,
+            "train_seconds": round(train_seconds, 3),
+            "words_per_second": round(words / train_seconds) if train_seconds > 0 else None,
+        }
+
+        if dev_set is not None and epoch % training["eval_frequency"] == 0:
+            started = time.perf_counter()
+            entry["dev"] = {name: round(value, 4) for name, value in dev_set.score(nlp).items()}
+            entry["eval_seconds"] = round(time.perf_counter() - started, 3)
+            if best_f1 is None or entry["dev"]["f1"] > best_f1:
+                best_f1 = entry["dev"]["f1"]
+                evals_without_improvement = 0
+                nlp.to_disk(output["model"])
+                entry["saved"] = True
+                log["best"] = {"epoch": epoch, **entry["dev"]}
+            else:
+                evals_without_improvement += 1
+
+        entry["wall_seconds"] = round(time.perf_counter() - run_started, 3)
+        log["epochs"].append(entry)
+        dev = ""
+        if "dev" in entry:
+            dev = (f", dev P/R/F1 {entry['dev']['precision']:.3f}/{entry['dev']['recall']:.3f}/"
+                   f"{entry['dev']['f1']:.3f}" + (" (saved)" if entry.get("saved") else ""))
+        print(f"Epoch {epoch}/{training['max_epochs']}, Loss: {entry['loss']:.2f}, "
+              f"{entry['words_per_second']} words/s, {train_seconds:.1f}s{dev}")
+
+        if dev_set is not None and training["patience"] and evals_without_improvement >= training["patience"]:
+            print(f"No dev F1 improvement in {training['patience']} evaluations; stopping early")
+            log["stopped_early"] = True
+            break
+
+    if dev_set is None:
+        nlp.to_disk(output["model"])
+    if output.get("last_model"):
+        nlp.to_disk(output["last_model"])
+    log["total_seconds"] = round(time.perf_counter() - run_started, 3)
+
+    if output.get("log"):
+        os.makedirs(os.path.dirname(output["log"]) or ".", exist_ok=True)
+        with open(output["log"], "w") as f:
+            json.dump(log, f, indent=2)
+
+    best = f" (best dev F1 {log['best']['f1']:.3f} at epoch {log['best']['epoch']})" if log["best"] else ""
+    print(f"\nTrained {len(log['epochs'])} epochs in {log['total_seconds']:.1f}s{best}")
+    print(f"Model saved to '{output['model']}/'")
+    return log
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the NER model from a JSON config.")
+    parser.add_argument("--config", default="configs/ner_augmented.json")
+    parser.add_argument("--output", default=None, help="Override output.model")
+    parser.add_argument("--max-epochs", type=int, default=None, help="Override training.max_epochs")
+    parser.add_argument("--seed", type=int, default=None, help="Override training.seed")
+    parser.add_argument("--tier", choices=sorted(MODEL_TIERS), default=None,
+                        help="Override model.tier (use with --output to keep tiers side by side)")
+    args = parser.parse_args()
+
+    config = load_training_config(args.config)
+    if args.output:
+        config["output"]["model"] = args.output
+    if args.max_epochs is not None:
+        config["training"]["max_epochs"] = args.max_epochs
+    if args.seed is not None:
+        config["training"]["seed"] = args.seed
+    if args.tier:
+        config["model"]["tier"] = args.tier
+    train_from_config(config)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+import os
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+from itertools import islice
+from augment_training_data import DEFAULT_AUGMENTATIONS, apply_augmentation, parse_augmentations
+from extraction import create_training_example
+
+DEFAULT_SHARD_SIZE = 10_000
+
+def doc_from_annotations(nlp, text, annotations):
+    """Tokenise once and attach entity spans, as Example.from_dict would align them.
+
+    Entities whose offsets do not fall on token boundaries are not
+    dropped: the tokens they touch are marked missing (BILUO "-") rather
+    than outside, which is what Example.from_dict does with them.
+    """
+    doc = nlp.make_doc(text)
+    spans = []
+    misaligned = []
+    for start, end, label in annotations.get("entities", []):
+        span = doc.char_span(start, end, label=label)
+        if span is not None:
+            spans.append(span)
+            continue
+        expanded = doc.char_span(start, end, alignment_mode="expand")
+        if expanded is not None:
+            misaligned.append(expanded)
+
+    in_entity = {token.i for span in spans for token in span}
+    missing_tokens = {i for span in misaligned for i in range(span.start, span.end)} - in_entity
+    missing = [doc[i:i + 1] for i in sorted(missing_tokens)]
+    doc.set_ents(spans, missing=missing, default="outside")
+    return doc
+
+def example_from_reference(nlp, reference):
+    """Pair an annotated Doc with an unannotated copy of its tokens (no re-tokenising)."""
+    from spacy.tokens import Doc
+    from spacy.training import Example
+    predicted = Doc(nlp.vocab, words=[token.text for token in reference],
+                    spaces=[bool(token.whitespace_) for token in reference])
+    return Example(predicted, reference)
+
+class _ShardWriter:
+    """Accumulate Docs and write a numbered .spacy shard each time `shard_size` is reached."""
+
+    def __init__(self, output_dir, shard_size=DEFAULT_SHARD_SIZE):
+        from spacy.tokens import DocBin
+        self.DocBin = DocBin
+        self.output_dir = output_dir
+        self.shard_size = shard_size
+        self.shard = DocBin()
+        self.shards = 0
+        self.written = 0
+        os.makedirs(output_dir, exist_ok=True)
+        for old_shard in glob(os.path.join(output_dir, "*.spacy")):
+            os.remove(old_shard)
+
+    def add(self, doc):
+        self.shard.add(doc)
+        if len(self.shard) >= self.shard_size:
+            self.flush()
+
+    def merge(self, docbin, vocab):
+        """Add a worker's DocBin doc by doc, so shards split exactly as with add()."""
+        for doc in docbin.get_docs(vocab):
+            self.add(doc)
+
+    def flush(self):
+        self.shard.to_disk(os.path.join(self.output_dir, f"{self.shards:05d}.spacy"))
+        self.shards += 1
+        self.written += len(self.shard)
+        self.shard = self.DocBin()
+
+    def close(self):
+        if len(self.shard) or not self.shards:
+            self.flush()
+        return self.written
+
+def write_docbin_corpus(examples, output_dir, nlp=None, shard_size=DEFAULT_SHARD_SIZE):
+    """Write (text, {"entities": [...]}) examples as sharded DocBin files.
+
+    Examples are consumed lazily and each shard is written once it holds
+    `shard_size` docs, so memory stays bounded. Returns the number of
+    docs written. Existing shards in `output_dir` are replaced.
+    """
+    import spacy
+
+    nlp = nlp or spacy.blank("en")
+    writer = _ShardWriter(output_dir, shard_size)
+    for text, annotations in examples:
+        writer.add(doc_from_annotations(nlp, text, annotations))
+    return writer.close()
+
+_worker_nlp = None
+
+def _chunks(items, size):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _init_corpus_worker(lang="en"):
+    global _worker_nlp
+    import spacy
+    _worker_nlp = spacy.blank(lang)
+
+def _annotate_chunk(texts):
+    """Label a chunk of report texts with create_training_example; returns DocBin bytes."""
+    from spacy.tokens import DocBin
+    chunk = DocBin()
+    for text in texts:
+        text, annotations = create_training_example(text)
+        chunk.add(doc_from_annotations(_worker_nlp, text, annotations))
+    return chunk.to_bytes()
+
+def build_training_corpus(texts, output_dir, workers=None, chunk_size=256, shard_size=DEFAULT_SHARD_SIZE,
+                          lang="en"):
+    """Annotate report texts across worker processes and write DocBin shards as results arrive.
+
+    `texts` may be any iterable (e.g. iter_augmented_reports); it is
+    read in chunks and at most a few chunks per worker are in flight, so
+    memory stays flat however large the corpus. Shards keep input order
+    and hold exactly `shard_size` docs, as write_docbin_corpus writes them.
+    Returns the number of docs written.
+    """
+    from spacy.tokens import DocBin
+
+    workers = workers or os.cpu_count() or 1
+    writer = _ShardWriter(output_dir, shard_size)
+    chunks = _chunks(texts, chunk_size)
+
+    _init_corpus_worker(lang)
+    vocab = _worker_nlp.vocab
+    if workers == 1:
+        for chunk in chunks:
+            writer.merge(DocBin().from_bytes(_annotate_chunk(chunk)), vocab)
+        return writer.close()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_corpus_worker, initargs=(lang,)) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_annotate_chunk, chunk))
+            if len(pending) >= workers * 2:
+                writer.merge(DocBin().from_bytes(pending.popleft().result()), vocab)
+        while pending:
+            writer.merge(DocBin().from_bytes(pending.popleft().result()), vocab)
+    return writer.close()
+
+class DocBinCorpus:
+    """Pre-tokenised training examples streamed from a directory of .spacy shards.
+
+    Each reference Doc already carries its tokens and entity spans, so
+    no tokenizer runs during training. With `in_memory`, the Examples
+    are built on the first pass and reused every epoch; otherwise the
+    shards are re-read each epoch (still without re-tokenising).
+    """
+
+    def __init__(self, path, in_memory=True):
+        self.path = path
+        self.in_memory = in_memory
+        self._examples = None
+
+    def shards(self):
+        if os.path.isfile(self.path):
+            return [self.path]
+        return sorted(glob(os.path.join(self.path, "*.spacy")))
+
+    def docs(self, vocab, rng=None):
+        """Yield reference Docs shard by shard; with `rng`, shard and doc order are shuffled."""
+        from spacy.tokens import DocBin
+        shards = self.shards()
+        if rng is not None:
+            rng.shuffle(shards)
+        for shard in shards:
+            docs = list(DocBin().from_disk(shard).get_docs(vocab))
+            if rng is not None:
+                rng.shuffle(docs)
+            yield from docs
+
+    def _stream(self, nlp, rng=None):
+        for reference in self.docs(nlp.vocab, rng):
+            yield example_from_reference(nlp, reference)
+
+    def examples(self, nlp, shuffle=False, seed=None):
+        """Return this epoch's Examples.
+
+        In memory, `shuffle` reorders all examples; when streaming, it
+        shuffles shard order and docs within each shard, so only one
+        shard is held at a time.
+        """
+        rng = random.Random(seed) if shuffle else None
+        if not self.in_memory:
+            return self._stream(nlp, rng)
+        if self._examples is None:
+            self._examples = list(self._stream(nlp))
+        examples = list(self._examples)
+        if rng is not None:
+            rng.shuffle(examples)
+        return examples
+
+    def labels(self, vocab):
+        return sorted({ent.label_ for doc in self.docs(vocab) for ent in doc.ents})
+
+class AugmentingCorpus:
+    """Training examples augmented on the fly instead of read from disk.
+
+    Each call to `examples` is one epoch: reports are shuffled, and for
+    each report `variants_per_report` entries of the augmentation `spec`
+    (see augment_training_data.parse_augmentations, copies act as
+    weights) are drawn without replacement; None takes all of them.
+    Each variant's transforms are applied with the epoch's rng, so they
+    swap a random subset of names, phrases, flags and spacings and
+    every epoch sees new texts. Entities are re-derived from the
+    transformed text with create_training_example. Randomness comes
+    from (`seed`, epoch), so a run is reproducible.
+    """
+
+    def __init__(self, texts, spec=DEFAULT_AUGMENTATIONS, variants_per_report=None, seed=0):
+        self.texts = list(texts)
+        self.augmentations = parse_augmentations(spec)
+        self.weights = [copies for _, _, copies in self.augmentations]
+        self.variants_per_report = variants_per_report
+        self.seed = seed
+        self.epoch = 0
+
+    def _variants(self, rng):
+        if self.variants_per_report is None:
+            return [i for i, copies in enumerate(self.weights) for _ in range(copies)]
+        return rng.sample(range(len(self.augmentations)), counts=self.weights, k=self.variants_per_report)
+
+    def _example(self, nlp, text):
+        text, annotations = create_training_example(text)
+        return example_from_reference(nlp, doc_from_annotations(nlp, text, annotations))
+
+    def examples(self, nlp, shuffle=False, seed=None):
+        """Yield this epoch's freshly augmented Examples; only (report, variant) indices are shuffled up front."""
+        rng = random.Random(f"{self.seed}:{self.epoch}" if seed is None else seed)
+        self.epoch += 1
+        pairs = [(i, j) for i in range(len(self.texts)) for j in self._variants(rng)]
+        if shuffle:
+            rng.shuffle(pairs)
+        for i, j in pairs:
+            yield self._example(nlp, apply_augmentation(self.texts[i], self.augmentations[j][1], rng))
+
+    def labels(self, vocab):
+        """Entity labels over every configured variant of every report."""
+        import spacy
+        nlp = spacy.blank(vocab.lang)
+        labels = set()
+        for text in self.texts:
+            for _, functions, _ in self.augmentations:
+                doc = doc_from_annotations(nlp, *create_training_example(apply_augmentation(text, functions)))
+                labels.update(ent.label_ for ent in doc.ents)
+        return sorted(labels)